@@ -0,0 +1,84 @@
+# benchmark_shell_emulator.py
+
+import os
+import sys
+import time
+import random
+import zipfile
+import tempfile
+import argparse
+
+from shell_emulator import ZipShellEmulator, StreamingXMLLogger, execute_command
+
+BENCHMARK_COMMANDS = ("ls", "cd", "tac", "pwd")
+
+def make_synthetic_zip(zip_path, entries):
+    # Two directory levels with roughly 1000 files per top-level directory
+    dir_count = max(1, entries // 1000)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for i in range(entries):
+            path = f"dir{i % dir_count}/sub{(i // dir_count) % 10}/file{i}.txt"
+            zipf.writestr(path, f"line 1 of file {i}\nline 2 of file {i}\n")
+    return dir_count
+
+def make_session(rng, dir_count, entries, commands):
+    script = []
+    while len(script) < commands:
+        i = rng.randrange(entries)
+        script.append(f"cd /dir{i % dir_count}/sub{(i // dir_count) % 10}")
+        script.append("ls")
+        script.append("pwd")
+        script.append(f"tac file{i}.txt")
+    return script[:commands]
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def run_benchmark(entries, commands, seed=0):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "vfs.zip")
+        started = time.perf_counter()
+        dir_count = make_synthetic_zip(zip_path, entries)
+        print(f"\n{entries} entries (archive built in {time.perf_counter() - started:.1f}s)")
+
+        logger = StreamingXMLLogger(os.path.join(temp_dir, "log.xml"))
+        for label in ("cold start", "warm start"):
+            started = time.perf_counter()
+            emulator = ZipShellEmulator(zip_path, logger)
+            print(f"  {label}: {(time.perf_counter() - started) * 1000:.1f} ms")
+            if label == "cold start":
+                emulator.close()
+
+        latencies = {name: [] for name in BENCHMARK_COMMANDS}
+        script = make_session(random.Random(seed), dir_count, entries, commands)
+        with open(os.devnull, 'w') as out:
+            started = time.perf_counter()
+            for command in script:
+                command_started = time.perf_counter()
+                execute_command(emulator, command, out)
+                latencies[command.split(" ", 1)[0]].append(time.perf_counter() - command_started)
+            elapsed = time.perf_counter() - started
+            execute_command(emulator, "exit", out)
+
+        print(f"  {len(script)} commands in {elapsed:.2f}s: {len(script) / elapsed:.0f} commands/sec")
+        for name in BENCHMARK_COMMANDS:
+            samples = latencies[name]
+            print(
+                f"  {name:<4} p50={percentile(samples, 50) * 1e6:8.1f}us"
+                f"  p95={percentile(samples, 95) * 1e6:8.1f}us"
+                f"  p99={percentile(samples, 99) * 1e6:8.1f}us"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ZipShellEmulator commands on synthetic archives.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Archive sizes (number of entries) to benchmark")
+    parser.add_argument("--commands", type=int, default=20_000, help="Commands to replay per archive")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the replayed session")
+    args = parser.parse_args()
+    for entries in args.sizes:
+        run_benchmark(entries, args.commands, args.seed)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,47 +1,1103 @@
 import os
+import io
+import sys
+import bz2
+import lzma
+import mmap
+import zlib
+import bisect
+import struct
+import shutil
+import hashlib
+import time
+import tarfile
 import zipfile
+import tempfile
+import threading
+import re
 import json
+import shlex
+import fnmatch
+import asyncio
+import argparse
+import multiprocessing
 import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+def build_command_element(command, output):
+    command_element = ET.Element("command")
+    ET.SubElement(command_element, "name").text = command
+    ET.SubElement(command_element, "timestamp").text = datetime.now().isoformat()
+    ET.SubElement(command_element, "output").text = output
+    return command_element
+
 class XMLLogger:
     def __init__(self, log_path):
         self.log_path = log_path
         self.root = ET.Element("session")
     
     def log_command(self, command, output):
-        command_element = ET.SubElement(self.root, "command")
-        ET.SubElement(command_element, "name").text = command
-        ET.SubElement(command_element, "timestamp").text = datetime.now().isoformat()
-        ET.SubElement(command_element, "output").text = output
+        self.root.append(build_command_element(command, output))
     
     def save(self):
         tree = ET.ElementTree(self.root)
         tree.write(self.log_path, encoding="utf-8", xml_declaration=True)
 
+SESSION_END = b"</session>"
+
+class StreamingXMLLogger:
+    # Appends each <command> to the log as it happens instead of keeping the
+    # whole session in memory; the file is rotated to log.xml.1, log.xml.2, ...
+    # once it grows past max_bytes, and every file gets its closing tag
+    def __init__(self, log_path, max_bytes=10 * 1024 * 1024, backup_count=3,
+                 buffer_size=64 * 1024, flush_every=100, flush_interval=5.0):
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = None
+        self._open()
+    
+    def _open(self):
+        self.file = open(self.log_path, 'wb', buffering=self.buffer_size)
+        self.file.write(b"<?xml version='1.0' encoding='utf-8'?>\n<session>")
+        self.pending = 0
+        self.last_flush = time.monotonic()
+    
+    def _reopen(self):
+        # Logging after save continues the saved file: its closing tag is dropped and
+        # new records are appended, so nothing written so far is lost
+        try:
+            self.file = open(self.log_path, 'r+b', buffering=self.buffer_size)
+        except FileNotFoundError:
+            self._open()
+            return
+        self.file.seek(-len(SESSION_END), os.SEEK_END)
+        self.file.truncate()
+        self.pending = 0
+        self.last_flush = time.monotonic()
+    
+    def _close(self):
+        self.file.write(SESSION_END)
+        self.file.close()
+        self.file = None
+    
+    def _rotate(self):
+        self._close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.log_path}.{i}"):
+                    os.replace(f"{self.log_path}.{i}", f"{self.log_path}.{i + 1}")
+            os.replace(self.log_path, f"{self.log_path}.1")
+        self._open()
+    
+    def log_command(self, command, output):
+        if self.file is None:
+            self._reopen()
+        self.file.write(ET.tostring(build_command_element(command, output), encoding="utf-8"))
+        self.pending += 1
+        if self.pending >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.file.flush()
+            self.pending = 0
+            self.last_flush = time.monotonic()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._rotate()
+    
+    def save(self):
+        if self.file is not None:
+            self._close()
+
+class DirectoryNode:
+    def __init__(self):
+        self.dirs = {}
+        self.files = {}
+
+class DirectoryIndex:
+    # Trie of path components, built once so ls/cd only touch one directory
+    def __init__(self, infos=()):
+        self.root = DirectoryNode()
+        for info in infos:
+            self.add(info)
+    
+    def add(self, info):
+        parts = info.filename.split('/')
+        node = self.root
+        # Intermediate components become directories even without a "dir/" entry
+        for part in parts[:-1]:
+            if part:
+                node = node.dirs.setdefault(part, DirectoryNode())
+        if parts[-1]:
+            node.files[parts[-1]] = info
+    
+    def find_dir(self, path):
+        node = self.root
+        for part in path.split('/'):
+            if part:
+                node = node.dirs.get(part)
+                if node is None:
+                    return None
+        return node
+    
+    def find_file(self, path):
+        dirname, _, basename = path.rpartition('/')
+        node = self.find_dir(dirname)
+        if node is None:
+            return None
+        return node.files.get(basename)
+    
+    def listdir(self, path):
+        node = self.find_dir(path)
+        if node is None:
+            return []
+        return sorted(set(node.dirs) | set(node.files))
+    
+    def walk(self, path):
+        # Depth-first in sorted order, yielding (full path, is_dir, file info or None)
+        node = self.find_dir(path)
+        if node is None:
+            return
+        path = path.strip('/')
+        stack = [self._iter_children(node, path + '/' if path else '')]
+        while stack:
+            entry = next(stack[-1], None)
+            if entry is None:
+                stack.pop()
+                continue
+            full_path, child, info = entry
+            yield full_path, child is not None, info
+            if child is not None:
+                stack.append(self._iter_children(child, full_path + '/'))
+    
+    def _iter_children(self, node, prefix):
+        dirs, files = node.dirs, node.files
+        for name in sorted(set(dirs) | set(files)):
+            if name in dirs:
+                yield prefix + name, dirs[name], None
+            if name in files:
+                yield prefix + name, None, files[name]
+    
+    def close(self):
+        pass
+
+# Sidecar index layout: header, fixed-size node records in BFS order, names blob.
+# Children of a directory are stored contiguously, so each directory is decoded
+# from the memory-mapped file only when ls/cd/tac first touches it.
+INDEX_MAGIC = b"ZSHIDX01"
+INDEX_HEADER = struct.Struct("<8sQq32sI")
+INDEX_NODE = struct.Struct("<IHBxIIQQQIHH")
+END_RECORD = struct.Struct("<4s4H2LH")
+END_RECORD_64 = struct.Struct("<4sQ2H2L4Q")
+END_LOCATOR_64 = struct.Struct("<4sLQL")
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_RECORD = struct.Struct("<4s4B4HL2L5H2L")
+ZIP64_LIMIT = 0xFFFFFFFF
+COPY_CHUNK_SIZE = 1024 * 1024
+
+TAC_BLOCK_SIZE = 64 * 1024
+LOG_OUTPUT_LIMIT = 4096
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+GZIP_CHUNK_SIZE = 64 * 1024
+GZIP_CHECKPOINT_INTERVAL = 4 * 1024 * 1024
+
+SIZE_FILTER = re.compile(r"([+-]?)(\d+)([kM]?)")
+SIZE_UNITS = {"": 1, "k": 1024, "M": 1024 * 1024}
+GREP_MATCH_LIMIT = 1000
+GREP_PARALLEL_THRESHOLD = 64
+GREP_BATCH_SIZE = 32
+FIND_USAGE = "Usage: find [path] [-name pattern] [-size [+|-]N[k|M]] [-type f|d]"
+GREP_USAGE = "Usage: grep [-i] [-m limit] pattern [path]"
+
+class MappedDirectoryNode(DirectoryNode):
+    def __init__(self, index, node_id, path):
+        self._index = index
+        self._node_id = node_id
+        self._path = path
+        self._dirs = None
+        self._files = None
+    
+    @property
+    def dirs(self):
+        if self._dirs is None:
+            self._load()
+        return self._dirs
+    
+    @property
+    def files(self):
+        if self._files is None:
+            self._load()
+        return self._files
+    
+    def _load(self):
+        # Build locally and publish at the end so sessions sharing the index never see a partial directory
+        dirs, files = {}, {}
+        first_child, child_count = self._index.read_node(self._node_id)[3:5]
+        for node_id in range(first_child, first_child + child_count):
+            (name_offset, name_len, is_dir, _, _, header_offset,
+             compress_size, file_size, crc, compress_type, flag_bits) = self._index.read_node(node_id)
+            name = self._index.read_name(name_offset, name_len)
+            if is_dir:
+                dirs[name] = MappedDirectoryNode(self._index, node_id, self._path + name + '/')
+            else:
+                info = zipfile.ZipInfo(self._path + name)
+                info.header_offset = header_offset
+                info.compress_size = compress_size
+                info.file_size = file_size
+                info.CRC = crc
+                info.compress_type = compress_type
+                info.flag_bits = flag_bits
+                files[name] = info
+        self._files = files
+        self._dirs = dirs
+
+class MappedDirectoryIndex(DirectoryIndex):
+    def __init__(self, buffer, node_count):
+        self.buffer = buffer
+        self.names_offset = INDEX_HEADER.size + node_count * INDEX_NODE.size
+        self.root = MappedDirectoryNode(self, 0, "")
+    
+    def read_node(self, node_id):
+        return INDEX_NODE.unpack_from(self.buffer, INDEX_HEADER.size + node_id * INDEX_NODE.size)
+    
+    def read_name(self, offset, length):
+        start = self.names_offset + offset
+        return self.buffer[start:start + length].decode('utf-8')
+    
+    def close(self):
+        self.buffer.close()
+
+def archive_key(zip_path, archive):
+    stat = os.stat(zip_path)
+    end = archive.rfind(b"PK\x05\x06", max(0, len(archive) - END_RECORD.size - 65535))
+    if end < 0:
+        raise zipfile.BadZipFile("File is not a zip file")
+    cd_end, cd_size = end, END_RECORD.unpack_from(archive, end)[5]
+    locator = end - END_LOCATOR_64.size
+    if locator >= 0 and archive[locator:locator + 4] == b"PK\x06\x07":
+        cd_end = locator - END_RECORD_64.size
+        cd_size = END_RECORD_64.unpack_from(archive, cd_end)[8]
+    digest = hashlib.sha256(archive[cd_end - cd_size:cd_end]).digest()
+    return stat.st_size, stat.st_mtime_ns, digest
+
+def save_index(index, index_path, key):
+    names = bytearray()
+    queue = deque([(index.root, 0, (0, 0))])
+    # Root is node 0; each directory reserves a contiguous block for its children
+    records = [None]
+    while queue:
+        node, node_id, name_ref = queue.popleft()
+        children = sorted(
+            [(name, 0, child) for name, child in node.files.items()]
+            + [(name, 1, child) for name, child in node.dirs.items()],
+            key=lambda child: (child[0], -child[1]),
+        )
+        first_child = len(records)
+        records.extend([None] * len(children))
+        for offset, (name, is_dir, child) in enumerate(children):
+            encoded = name.encode('utf-8')
+            child_ref = (len(names), len(encoded))
+            names += encoded
+            if is_dir:
+                queue.append((child, first_child + offset, child_ref))
+            else:
+                records[first_child + offset] = INDEX_NODE.pack(
+                    child_ref[0], child_ref[1], 0, 0, 0, child.header_offset,
+                    child.compress_size, child.file_size, child.CRC,
+                    child.compress_type, child.flag_bits,
+                )
+        records[node_id] = INDEX_NODE.pack(
+            name_ref[0], name_ref[1], 1, first_child, len(children), 0, 0, 0, 0, 0, 0,
+        )
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, *key, len(records)))
+        f.write(b"".join(records))
+        f.write(names)
+    os.replace(tmp_path, index_path)
+
+def load_index(zip_path, archive, index_path=None):
+    index_path = index_path or zip_path + ".idx"
+    key = archive_key(zip_path, archive)
+    try:
+        with open(index_path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = INDEX_HEADER.unpack_from(buffer)
+        if header[:4] == (INDEX_MAGIC,) + key:
+            return MappedDirectoryIndex(buffer, header[4])
+        buffer.close()
+    except (OSError, ValueError, struct.error):
+        pass
+    # Cache miss or stale sidecar: parse the central directory once and rewrite it
+    with zipfile.ZipFile(zip_path, 'r') as zip_file:
+        index = DirectoryIndex(zip_file.infolist())
+    try:
+        save_index(index, index_path, key)
+    except OSError:
+        pass
+    return index
+
+def member_data_offset(archive, info):
+    if info.flag_bits & 0x1:
+        raise NotImplementedError(f"Encrypted member: {info.filename}")
+    header = LOCAL_HEADER.unpack_from(archive, info.header_offset)
+    if header[0] != b"PK\x03\x04":
+        raise zipfile.BadZipFile(f"Bad local file header: {info.filename}")
+    return info.header_offset + LOCAL_HEADER.size + header[10] + header[11]
+
+def reverse_text_blocks(read_at, size, block_size=TAC_BLOCK_SIZE):
+    # Yields UTF-8 text reversed, one block at a time from the end of the data
+    carry = b""
+    end = size
+    while end > 0:
+        start = max(0, end - block_size)
+        block = read_at(start, end - start) + carry
+        cut = 0
+        # Continuation bytes at the block start belong to a character in the previous block
+        if start > 0:
+            while cut < min(len(block), 4) and block[cut] & 0xC0 == 0x80:
+                cut += 1
+        carry = block[:cut]
+        yield block[cut:].decode('utf-8')[::-1]
+        end = start
+
+def find_unquoted(text, char):
+    # Position of the first char outside quotes and not escaped, with shlex's POSIX rules, or -1
+    quote = None
+    escaped = False
+    for i, c in enumerate(text):
+        if escaped:
+            escaped = False
+        elif c == '\\' and quote != "'":
+            escaped = True
+        elif quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == char:
+            return i
+    return -1
+
+def join_lines(lines):
+    first = True
+    for line in lines:
+        yield line if first else "\n" + line
+        first = False
+
+def parse_size_filter(text):
+    match = SIZE_FILTER.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid size: '{text}'")
+    sign, number, unit = match.groups()
+    size = int(number) * SIZE_UNITS[unit]
+    if sign == '+':
+        return lambda file_size: file_size > size
+    if sign == '-':
+        return lambda file_size: file_size < size
+    return lambda file_size: file_size == size
+
+def grep_lines(regex, info, lines, limit):
+    matches = []
+    for lineno, line in enumerate(lines, 1):
+        text = line.decode('utf-8', errors='replace').rstrip('\r\n')
+        if regex.search(text):
+            matches.append(f"/{info.filename}:{lineno}:{text}")
+            if len(matches) >= limit:
+                break
+    return matches
+
+def map_file(path):
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# Each grep worker process opens the image once through the backend's worker_opener
+grep_worker_open = None
+
+def init_grep_worker(opener, path):
+    global grep_worker_open
+    grep_worker_open = opener(path)
+
+def grep_members(pattern, flags, members, limit):
+    regex = re.compile(pattern, flags)
+    matches = []
+    for info in members:
+        with grep_worker_open(info) as f:
+            matches += grep_lines(regex, info, f, limit - len(matches))
+        if len(matches) >= limit:
+            break
+    return matches
+
+class MappedRangeReader(io.RawIOBase):
+    # Reads the byte range [start, end) of a mapped file, optionally inflating it;
+    # uncompressed ranges are seekable so they can be read backwards in place
+    def __init__(self, archive, start, end, decompressor=None):
+        self.archive = archive
+        self.start = start
+        self.end = end
+        self.position = start
+        self.decompressor = decompressor
+        self.pending = b""
+        self.pending_position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return self.decompressor is None
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if self.decompressor is not None:
+            raise io.UnsupportedOperation("seek")
+        base = {io.SEEK_SET: self.start, io.SEEK_CUR: self.position, io.SEEK_END: self.end}[whence]
+        self.position = min(max(base + offset, self.start), self.end)
+        return self.position - self.start
+    
+    def tell(self):
+        return self.seek(0, io.SEEK_CUR)
+    
+    def readinto(self, buffer):
+        size = len(buffer)
+        if self.decompressor is None:
+            data = self.archive[self.position:min(self.position + size, self.end)]
+            self.position += len(data)
+        else:
+            while self.pending_position == len(self.pending) and self.position < self.end:
+                chunk = self.archive[self.position:min(self.position + max(size, 8192), self.end)]
+                self.position += len(chunk)
+                self.pending = self.decompressor.decompress(chunk)
+                self.pending_position = 0
+            data = self.pending[self.pending_position:self.pending_position + size]
+            self.pending_position += len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+class ZipLZMADecompressor:
+    # ZIP method 14: a 4-byte version/size header and 5 bytes of LZMA properties precede
+    # a raw LZMA1 stream, so the header is decoded before the first chunk is inflated
+    def __init__(self):
+        self.header = b""
+        self.decompressor = None
+    
+    def decompress(self, data):
+        if self.decompressor is None:
+            self.header += data
+            if len(self.header) < 4:
+                return b""
+            size = int.from_bytes(self.header[2:4], 'little')
+            if len(self.header) < 4 + size:
+                return b""
+            properties = self.header[4:4 + size]
+            lc, lp, pb = properties[0] % 9, properties[0] // 9 % 5, properties[0] // 45
+            self.decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[{
+                "id": lzma.FILTER_LZMA1, "dict_size": int.from_bytes(properties[1:5], 'little'),
+                "lc": lc, "lp": lp, "pb": pb,
+            }])
+            data, self.header = self.header[4 + size:], b""
+        if self.decompressor.eof:
+            return b""
+        return self.decompressor.decompress(data)
+
+class ZipMemberReader(MappedRangeReader):
+    # Reads a member straight from the mapped archive using offsets from the index
+    def __init__(self, archive, info):
+        start = member_data_offset(archive, info)
+        if info.compress_type == zipfile.ZIP_STORED:
+            decompressor = None
+        elif info.compress_type == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-15)
+        elif info.compress_type == zipfile.ZIP_BZIP2:
+            decompressor = bz2.BZ2Decompressor()
+        elif info.compress_type == zipfile.ZIP_LZMA:
+            decompressor = ZipLZMADecompressor()
+        else:
+            raise NotImplementedError(f"Unsupported compression method: {info.compress_type}")
+        super().__init__(archive, start, start + info.compress_size, decompressor)
+        self.info = info
+        self.crc = 0
+    
+    def seekable(self):
+        return False
+    
+    def readinto(self, buffer):
+        size = super().readinto(buffer)
+        self.crc = zlib.crc32(buffer[:size], self.crc)
+        if not size and self.crc != self.info.CRC:
+            raise zipfile.BadZipFile(f"Bad CRC-32 for file {self.info.filename!r}")
+        return size
+
+class GzipStreamReader(io.RawIOBase):
+    # Sequential reader over a mapped gzip file. It can resume from a checkpoint
+    # (output offset, input offset, decompressor snapshot), skip ahead and stop
+    # after length bytes, and records new checkpoints while reading if asked to
+    def __init__(self, archive, checkpoint=None, skip=0, length=None, checkpoints=None,
+                 checkpoint_interval=GZIP_CHECKPOINT_INTERVAL):
+        self.archive = archive
+        self.output_position, self.position, decompressor = checkpoint or (0, 0, None)
+        self.decompressor = decompressor.copy() if decompressor else zlib.decompressobj(31)
+        self.skip = skip
+        self.remaining = length
+        self.checkpoints = checkpoints
+        self.checkpoint_interval = checkpoint_interval
+        self.pending = b""
+        self.pending_position = 0
+    
+    def readable(self):
+        return True
+    
+    def _fill(self):
+        while self.pending_position == len(self.pending) and not self.decompressor.eof:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                if self.position >= len(self.archive):
+                    break
+                data = self.archive[self.position:self.position + GZIP_CHUNK_SIZE]
+                self.position += len(data)
+            self.pending = self.decompressor.decompress(data, GZIP_CHUNK_SIZE)
+            self.pending_position = 0
+            self.output_position += len(self.pending)
+            if self.checkpoints is not None and self.output_position - self.checkpoints[-1][0] >= self.checkpoint_interval:
+                self.checkpoints.append((self.output_position, self.position, self.decompressor.copy()))
+        return len(self.pending) - self.pending_position
+    
+    def readinto(self, buffer):
+        while self.skip and self._fill():
+            skipped = min(self.skip, len(self.pending) - self.pending_position)
+            self.pending_position += skipped
+            self.skip -= skipped
+        size = len(buffer) if self.remaining is None else min(len(buffer), self.remaining)
+        if not size or not self._fill():
+            return 0
+        data = self.pending[self.pending_position:self.pending_position + size]
+        self.pending_position += len(data)
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+class MemberInfo:
+    # Index entry for tar and directory backends; offset is the data offset in the uncompressed tar stream
+    __slots__ = ("filename", "file_size", "offset")
+    
+    def __init__(self, filename, file_size=0, offset=0):
+        self.filename = filename
+        self.file_size = file_size
+        self.offset = offset
+
+def open_zip_members(path):
+    archive = map_file(path)
+    return lambda info: io.BufferedReader(ZipMemberReader(archive, info))
+
+def open_tar_members(path):
+    archive = map_file(path)
+    return lambda info: io.BufferedReader(MappedRangeReader(archive, info.offset, info.offset + info.file_size))
+
+def open_directory_members(root):
+    return lambda info: open(os.path.join(root, info.filename), 'rb')
+
+class MemberCache:
+    # Byte-budgeted LRU of decompressed member contents, shared by every session on an image
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, max_entry_bytes=None):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 8 if max_entry_bytes is None else max_entry_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return data
+    
+    def put(self, key, data):
+        if len(data) > self.max_entry_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+    
+    def stats(self):
+        with self.lock:
+            return (
+                f"hits: {self.hits}\nmisses: {self.misses}\nevictions: {self.evictions}\n"
+                f"entries: {len(self.entries)}\nbytes: {self.size}/{self.max_bytes}"
+            )
+
+class ArchiveImage:
+    # Base class for VFS backends: a DirectoryIndex over the members plus ways to read them.
+    # open_seekable returns None when a member cannot be read backwards in place, and
+    # worker_opener is a picklable factory for grep worker processes (None keeps grep in-process)
+    worker_opener = None
+    
+    def __init__(self, path, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.index = None
+        self.cache = MemberCache(cache_bytes)
+        self.grep_workers = os.cpu_count() or 1
+        self.pool = None
+        self.pool_lock = threading.Lock()
+    
+    def open_member(self, info):
+        raise NotImplementedError
+    
+    def open_seekable(self, info):
+        return None
+    
+    def cache_key(self, info):
+        return info.filename
+    
+    def grep_pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                # Workers are not forked: the server process runs an event loop and a thread pool
+                self.pool = ProcessPoolExecutor(
+                    self.grep_workers, mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=init_grep_worker, initargs=(self.worker_opener, self.path),
+                )
+            return self.pool
+    
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+        if self.index is not None:
+            self.index.close()
+
+class ZipImage(ArchiveImage):
+    # Read-only mapped archive and its directory index; one image can back many sessions
+    worker_opener = staticmethod(open_zip_members)
+    
+    def __init__(self, zip_path, index_path=None, cache_bytes=DEFAULT_CACHE_BYTES):
+        super().__init__(zip_path, cache_bytes)
+        self.archive = map_file(zip_path)
+        self.index = load_index(zip_path, self.archive, index_path)
+    
+    def open_member(self, info):
+        return io.BufferedReader(ZipMemberReader(self.archive, info))
+    
+    def open_seekable(self, info):
+        if info.compress_type != zipfile.ZIP_STORED:
+            return None
+        start = member_data_offset(self.archive, info)
+        return MappedRangeReader(self.archive, start, start + info.compress_size)
+    
+    def close(self):
+        super().close()
+        self.archive.close()
+
+class TarImage(ArchiveImage):
+    # Uncompressed tars are indexed by data offset and read in place from the mapping.
+    # For .tar.gz the index pass also records decompressor checkpoints every
+    # checkpoint_interval bytes, so a member is read by resuming from the nearest
+    # checkpoint instead of decompressing the archive from the start
+    def __init__(self, tar_path, cache_bytes=DEFAULT_CACHE_BYTES, checkpoint_interval=GZIP_CHECKPOINT_INTERVAL):
+        super().__init__(tar_path, cache_bytes)
+        self.archive = map_file(tar_path)
+        self.compressed = self.archive[:2] == GZIP_MAGIC
+        self.worker_opener = None if self.compressed else open_tar_members
+        if self.compressed:
+            self.checkpoints = [(0, 0, zlib.decompressobj(31))]
+            stream = io.BufferedReader(GzipStreamReader(
+                self.archive, checkpoints=self.checkpoints, checkpoint_interval=checkpoint_interval,
+            ))
+            mode = 'r|'
+        else:
+            stream = io.BufferedReader(MappedRangeReader(self.archive, 0, len(self.archive)))
+            mode = 'r:'
+        self.index = DirectoryIndex()
+        with tarfile.open(fileobj=stream, mode=mode) as tar:
+            for member in tar:
+                if member.isdir():
+                    self.index.add(MemberInfo(member.name.rstrip('/') + '/'))
+                elif member.isfile():
+                    self.index.add(MemberInfo(member.name, member.size, member.offset_data))
+        self.checkpoint_offsets = [checkpoint[0] for checkpoint in self.checkpoints] if self.compressed else None
+    
+    def open_member(self, info):
+        if not self.compressed:
+            return io.BufferedReader(MappedRangeReader(self.archive, info.offset, info.offset + info.file_size))
+        checkpoint = self.checkpoints[bisect.bisect_right(self.checkpoint_offsets, info.offset) - 1]
+        return io.BufferedReader(GzipStreamReader(
+            self.archive, checkpoint, skip=info.offset - checkpoint[0], length=info.file_size,
+        ))
+    
+    def open_seekable(self, info):
+        if self.compressed:
+            return None
+        return MappedRangeReader(self.archive, info.offset, info.offset + info.file_size)
+    
+    def close(self):
+        super().close()
+        self.archive.close()
+
+class DirectoryImage(ArchiveImage):
+    # A plain directory tree; members are regular files opened from disk
+    worker_opener = staticmethod(open_directory_members)
+    
+    def __init__(self, root, cache_bytes=DEFAULT_CACHE_BYTES):
+        super().__init__(root, cache_bytes)
+        self.index = DirectoryIndex()
+        for dirpath, dirnames, filenames in os.walk(root):
+            relative = os.path.relpath(dirpath, root).replace(os.sep, '/')
+            prefix = '' if relative == '.' else relative + '/'
+            for name in dirnames:
+                self.index.add(MemberInfo(prefix + name + '/'))
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path):
+                    self.index.add(MemberInfo(prefix + name, os.path.getsize(path)))
+    
+    def open_member(self, info):
+        return open(os.path.join(self.path, info.filename), 'rb')
+    
+    def open_seekable(self, info):
+        return self.open_member(info)
+
+def open_image(path, index_path=None, cache_bytes=DEFAULT_CACHE_BYTES):
+    if os.path.isdir(path):
+        return DirectoryImage(path, cache_bytes)
+    if zipfile.is_zipfile(path):
+        return ZipImage(path, index_path, cache_bytes)
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == GZIP_MAGIC or tarfile.is_tarfile(path):
+        return TarImage(path, cache_bytes)
+    return ZipImage(path, index_path, cache_bytes)
+
+def dos_date_time(timestamp=None):
+    t = time.localtime(timestamp)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+class ZipStreamWriter:
+    # Single-pass ZIP writer: members are either copied as raw local records from a
+    # mapped archive (no recompression) or deflated from a stream; the central
+    # directory, with ZIP64 records where needed, is written by close()
+    def __init__(self, f):
+        self.f = f
+        self.records = []
+    
+    def copy_member(self, archive, info):
+        header = LOCAL_HEADER.unpack_from(archive, info.header_offset)
+        flags, method, mtime, mdate = header[3:7]
+        name_start = info.header_offset + LOCAL_HEADER.size
+        name = archive[name_start:name_start + header[10]]
+        end = name_start + header[10] + header[11] + info.compress_size
+        if flags & 0x8:
+            end += 16 if archive[end:end + 4] == b"PK\x07\x08" else 12
+        offset = self.f.tell()
+        for position in range(info.header_offset, end, COPY_CHUNK_SIZE):
+            self.f.write(archive[position:min(position + COPY_CHUNK_SIZE, end)])
+        self.records.append((header[1], flags, method, mtime, mdate, info.CRC,
+                             info.compress_size, info.file_size, name, offset, 0o644 << 16))
+    
+    def add_member(self, name, stream, timestamp=None):
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else 0x800
+        mtime, mdate = dos_date_time(timestamp)
+        offset = self.f.tell()
+        self.f.write(LOCAL_HEADER.pack(b"PK\x03\x04", 20, 0, flags, zipfile.ZIP_DEFLATED,
+                                       mtime, mdate, 0, 0, 0, len(encoded), 0))
+        self.f.write(encoded)
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        crc = file_size = compress_size = 0
+        while True:
+            chunk = stream.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            compressed = compressor.compress(chunk)
+            compress_size += len(compressed)
+            self.f.write(compressed)
+        compressed = compressor.flush()
+        compress_size += len(compressed)
+        self.f.write(compressed)
+        if max(file_size, compress_size) >= ZIP64_LIMIT:
+            raise ValueError(f"Member too large for a plain ZIP entry: {name}")
+        # The output is seekable, so sizes are patched into the local header instead of a data descriptor
+        end = self.f.tell()
+        self.f.seek(offset + 14)
+        self.f.write(struct.pack("<3L", crc, compress_size, file_size))
+        self.f.seek(end)
+        self.records.append((20, flags, zipfile.ZIP_DEFLATED, mtime, mdate, crc,
+                             compress_size, file_size, encoded, offset, 0o644 << 16))
+    
+    def add_directory(self, name, timestamp=None):
+        encoded = (name.rstrip('/') + '/').encode('utf-8')
+        flags = 0 if encoded.isascii() else 0x800
+        mtime, mdate = dos_date_time(timestamp)
+        offset = self.f.tell()
+        self.f.write(LOCAL_HEADER.pack(b"PK\x03\x04", 20, 0, flags, zipfile.ZIP_STORED,
+                                       mtime, mdate, 0, 0, 0, len(encoded), 0))
+        self.f.write(encoded)
+        self.records.append((20, flags, zipfile.ZIP_STORED, mtime, mdate, 0, 0, 0,
+                             encoded, offset, (0o40755 << 16) | 0x10))
+    
+    def close(self):
+        cd_offset = self.f.tell()
+        for (version, flags, method, mtime, mdate, crc, compress_size,
+             file_size, name, offset, external_attr) in self.records:
+            # Values that do not fit in 32 bits move to a ZIP64 extra field
+            extra = [value for value in (file_size, compress_size, offset) if value >= ZIP64_LIMIT]
+            extra_field = struct.pack(f"<2H{len(extra)}Q", 1, 8 * len(extra), *extra) if extra else b""
+            self.f.write(CENTRAL_RECORD.pack(
+                b"PK\x01\x02", max(version, 45 if extra else 20), 3, max(version, 45 if extra else 20), 0,
+                flags, method, mtime, mdate, crc,
+                compress_size if compress_size < ZIP64_LIMIT else 0xFFFFFFFF,
+                file_size if file_size < ZIP64_LIMIT else 0xFFFFFFFF,
+                len(name), len(extra_field), 0, 0, 0, external_attr,
+                offset if offset < ZIP64_LIMIT else 0xFFFFFFFF,
+            ))
+            self.f.write(name)
+            self.f.write(extra_field)
+        cd_end = self.f.tell()
+        count, cd_size = len(self.records), cd_end - cd_offset
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            self.f.write(END_RECORD_64.pack(b"PK\x06\x06", END_RECORD_64.size - 12, 45, 45, 0, 0,
+                                            count, count, cd_size, cd_offset))
+            self.f.write(END_LOCATOR_64.pack(b"PK\x06\x07", 0, cd_end, 1))
+        self.f.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                     min(cd_size, 0xFFFFFFFF), min(cd_offset, 0xFFFFFFFF), 0))
+
+class OverlayNode(DirectoryNode):
+    # Merged view of one directory; children are recomputed on access because the overlay is mutable
+    def __init__(self, overlay, path, base, upper):
+        self._overlay = overlay
+        self._path = path
+        self._base = base
+        self._upper = upper
+    
+    @property
+    def dirs(self):
+        overlay, result = self._overlay, {}
+        upper_dirs = self._upper.dirs if self._upper is not None else {}
+        if self._base is not None:
+            for name, child in self._base.dirs.items():
+                path = self._path + name
+                if path not in overlay.whiteouts:
+                    base = None if path in overlay.opaque else child
+                    result[name] = OverlayNode(overlay, path + '/', base, upper_dirs.get(name))
+        for name, child in upper_dirs.items():
+            if name not in result:
+                result[name] = OverlayNode(overlay, self._path + name + '/', None, child)
+        return result
+    
+    @property
+    def files(self):
+        result = {}
+        if self._base is not None:
+            for name, info in self._base.files.items():
+                if self._path + name not in self._overlay.whiteouts:
+                    result[name] = info
+        if self._upper is not None:
+            result.update(self._upper.files)
+        return result
+
+class OverlayIndex(DirectoryIndex):
+    # Looks up paths component by component so cd/tac stay proportional to path depth
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.root = OverlayNode(overlay, '', overlay.base.index.root, overlay.upper.root)
+    
+    def find_dir(self, path):
+        overlay = self.overlay
+        base, upper, prefix = overlay.base.index.root, overlay.upper.root, ''
+        for part in path.split('/'):
+            if not part:
+                continue
+            prefix += part
+            if prefix in overlay.whiteouts or prefix in overlay.opaque:
+                base = None
+            base = base.dirs.get(part) if base is not None else None
+            upper = upper.dirs.get(part) if upper is not None else None
+            if base is None and upper is None:
+                return None
+            prefix += '/'
+        return OverlayNode(overlay, prefix, base, upper)
+    
+    def find_file(self, path):
+        dirname, _, basename = path.rpartition('/')
+        node = self.find_dir(dirname)
+        if node is None:
+            return None
+        if node._upper is not None and basename in node._upper.files:
+            return node._upper.files[basename]
+        if node._base is None or path.strip('/') in self.overlay.whiteouts:
+            return None
+        return node._base.files.get(basename)
+
+class OverlayImage(ArchiveImage):
+    # Copy-on-write layer over a read-only image. New and changed files are kept in
+    # memory, deletions are recorded as whiteouts and re-created directories become
+    # opaque, so every mutation is O(1) against the base; commit() writes the result
+    def __init__(self, base):
+        self.base = base
+        self.path = base.path
+        self.cache = base.cache
+        self.upper = DirectoryIndex()
+        self.contents = {}
+        self.whiteouts = set()
+        self.opaque = set()
+        self.index = OverlayIndex(self)
+    
+    @property
+    def dirty(self):
+        return bool(self.contents or self.whiteouts or self.upper.root.dirs)
+    
+    @property
+    def worker_opener(self):
+        return None if self.contents else self.base.worker_opener
+    
+    @property
+    def grep_workers(self):
+        return self.base.grep_workers
+    
+    def grep_pool(self):
+        return self.base.grep_pool()
+    
+    def is_upper(self, info):
+        return self.upper.find_file(info.filename) is info
+    
+    def cache_key(self, info):
+        return None if self.is_upper(info) else self.base.cache_key(info)
+    
+    def open_member(self, info):
+        if self.is_upper(info):
+            return io.BytesIO(self.contents[info.filename])
+        return self.base.open_member(info)
+    
+    def open_seekable(self, info):
+        if self.is_upper(info):
+            return io.BytesIO(self.contents[info.filename])
+        return self.base.open_seekable(info)
+    
+    def write_file(self, path, data):
+        # A whiteout stays in place: upper files already shadow base files, and a removed
+        # base directory at this path must stay hidden together with its members
+        self.upper.add(MemberInfo(path, len(data)))
+        self.contents[path] = data
+    
+    def make_dir(self, path):
+        self.upper.add(MemberInfo(path + '/'))
+        if path in self.whiteouts:
+            self.whiteouts.discard(path)
+            self.opaque.add(path)
+    
+    def remove(self, path):
+        dirname, _, basename = path.rpartition('/')
+        upper_parent = self.upper.find_dir(dirname)
+        if upper_parent is not None:
+            upper_parent.files.pop(basename, None)
+            if upper_parent.dirs.pop(basename, None) is not None:
+                prefix = path + '/'
+                for name in [name for name in self.contents if name.startswith(prefix)]:
+                    del self.contents[name]
+        self.contents.pop(path, None)
+        self.whiteouts.add(path)
+    
+    def commit(self, output_path):
+        # One streaming pass over the merged tree; unchanged ZIP members keep their compressed bytes
+        tmp_path = output_path + ".tmp"
+        count = 0
+        with open(tmp_path, 'wb') as f:
+            writer = ZipStreamWriter(f)
+            for path, is_dir, info in self.index.walk(''):
+                if is_dir:
+                    writer.add_directory(path)
+                elif not self.is_upper(info) and isinstance(self.base, ZipImage):
+                    writer.copy_member(self.base.archive, info)
+                else:
+                    with self.open_member(info) as stream:
+                        writer.add_member(path, stream)
+                count += 1
+            writer.close()
+        os.replace(tmp_path, output_path)
+        return count
+    
+    def close(self):
+        pass
+
 class ZipShellEmulator:
-    def __init__(self, zip_path, logger):
+    def __init__(self, zip_path, logger, index_path=None, image=None, allow_commit=True, commit_dir=None):
         self.zip_path = zip_path
+        # With commit_dir set, commit only writes files directly inside it (server sessions)
+        self.allow_commit = allow_commit
+        self.commit_dir = commit_dir
         self.current_dir = ""
         self.logger = logger
-        self.zip_file = zipfile.ZipFile(zip_path, 'r')
+        self.index_path = index_path
+        self.owns_image = image is None
+        self.base_image = image or open_image(zip_path, index_path)
+        # Mutating commands only touch this session's overlay; the base image stays read-only
+        self.image = OverlayImage(self.base_image)
+        self.index = self.image.index
+    
+    def open_member(self, info):
+        return self.image.open_member(info)
+    
+    def read_member(self, info):
+        # Read commands share the image cache; members too large for it return None and are streamed
+        key = self.image.cache_key(info)
+        if key is None:
+            with self.open_member(info) as f:
+                return f.read()
+        if info.file_size > self.image.cache.max_entry_bytes:
+            return None
+        data = self.image.cache.get(key)
+        if data is None:
+            with self.open_member(info) as f:
+                data = f.read()
+            self.image.cache.put(key, data)
+        return data
     
     def ls(self):
-        contents = [
-            name[len(self.current_dir):].split('/')[0]
-            for name in self.zip_file.namelist()
-            if name.startswith(self.current_dir) and name != self.current_dir
-        ]
-        contents = sorted(set(contents))  # Remove duplicates and sort
-        output = "\n".join(contents)
+        output = "\n".join(self.index.listdir(self.current_dir))
         self.logger.log_command("ls", output)
         return output
     
+    def resolve(self, path):
+        resolved = os.path.normpath(os.path.join(self.current_dir, path)).strip('/')
+        return '' if resolved == '.' else resolved
+    
+    def emit(self, command, chunks, out):
+        # With an output stream the text is written incrementally and only
+        # the first LOG_OUTPUT_LIMIT characters are kept for the log
+        if out is None:
+            output = "".join(chunks)
+        else:
+            output = ""
+            written = 0
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+                if len(output) < LOG_OUTPUT_LIMIT:
+                    output += chunk[:LOG_OUTPUT_LIMIT - len(output)]
+            if written > LOG_OUTPUT_LIMIT:
+                output += "..."
+        self.logger.log_command(command, output)
+        return output
+    
     def cd(self, path):
-        new_dir = os.path.normpath(os.path.join(self.current_dir, path)) + '/'
-        if any(name.startswith(new_dir) for name in self.zip_file.namelist()):
-            self.current_dir = new_dir
-            output = f"Changed directory to {new_dir}"
+        new_dir = self.resolve(path)
+        if self.index.find_dir(new_dir) is not None:
+            self.current_dir = new_dir + '/' if new_dir else ''
+            output = f"Changed directory to {self.current_dir or '/'}"
         else:
             output = "Directory not found"
         self.logger.log_command("cd", output)
@@ -52,15 +1108,125 @@ class ZipShellEmulator:
         self.logger.log_command("pwd", output)
         return output
     
-    def tac(self, filename):
+    def iter_tac(self, info):
+        seekable = self.image.open_seekable(info)
+        if seekable is not None:
+            # Uncompressed members are read backwards in place
+            with seekable:
+                def read_at(offset, size):
+                    seekable.seek(offset)
+                    return seekable.read(size)
+                
+                yield from reverse_text_blocks(read_at, info.file_size)
+            return
+        data = self.read_member(info)
+        if data is not None:
+            yield from reverse_text_blocks(lambda offset, size: data[offset:offset + size], len(data))
+            return
+        # Large compressed streams cannot be read backwards, so spill them to a temp file first
+        with tempfile.TemporaryFile() as spill:
+            with self.open_member(info) as f:
+                shutil.copyfileobj(f, spill, TAC_BLOCK_SIZE)
+            
+            def read_at(offset, size):
+                spill.seek(offset)
+                return spill.read(size)
+            
+            yield from reverse_text_blocks(read_at, spill.tell())
+    
+    def tac(self, filename, out=None):
         filepath = os.path.normpath(self.current_dir + filename)
+        info = self.index.find_file(filepath)
+        if info is None:
+            return self.emit("tac", ["File not found"], out)
+        return self.emit("tac", self.iter_tac(info), out)
+    
+    def iter_find(self, start, name_pattern=None, size_filter=None, kind=None):
+        for path, is_dir, info in self.index.walk(start):
+            if kind == 'f' and is_dir or kind == 'd' and not is_dir:
+                continue
+            if name_pattern and not fnmatch.fnmatchcase(path.rpartition('/')[2], name_pattern):
+                continue
+            if size_filter and (is_dir or not size_filter(info.file_size)):
+                continue
+            yield '/' + path
+    
+    def find(self, arg="", out=None):
         try:
-            with self.zip_file.open(filepath, 'r') as f:
-                lines = f.readlines()
-            output = "".join(line.decode('utf-8')[::-1] for line in lines[::-1])
-        except KeyError:
-            output = "File not found"
-        self.logger.log_command("tac", output)
+            args = shlex.split(arg)
+            start = self.current_dir
+            if args and not args[0].startswith('-'):
+                start = self.resolve(args.pop(0))
+            options = dict(zip(args[::2], args[1::2]))
+            if len(args) % 2 or set(options) - {"-name", "-size", "-type"} or options.get("-type", "f") not in ("f", "d"):
+                raise ValueError(FIND_USAGE)
+            size_filter = parse_size_filter(options["-size"]) if "-size" in options else None
+        except ValueError as e:
+            return self.emit("find", [str(e)], out)
+        if self.index.find_dir(start) is None:
+            return self.emit("find", ["Directory not found"], out)
+        lines = self.iter_find(start, options.get("-name"), size_filter, options.get("-type"))
+        return self.emit("find", join_lines(lines), out)
+    
+    def iter_grep(self, pattern, flags, start, limit):
+        members = [info for _, is_dir, info in self.index.walk(start) if not is_dir]
+        found = 0
+        if len(members) < GREP_PARALLEL_THRESHOLD or self.image.worker_opener is None:
+            # Small searches stay in-process and share the decompressed-member cache
+            regex = re.compile(pattern, flags)
+            for info in members:
+                data = self.read_member(info)
+                with io.BytesIO(data) if data is not None else self.open_member(info) as f:
+                    for match in grep_lines(regex, info, f, limit - found):
+                        found += 1
+                        yield match
+                if found >= limit:
+                    return
+            return
+        # Batches are scanned in worker processes; a bounded window of futures is
+        # consumed in submission order so matches stream back in archive order
+        pool = self.image.grep_pool()
+        window = 2 * self.image.grep_workers
+        pending = deque()
+        batches = [members[i:i + GREP_BATCH_SIZE] for i in range(0, len(members), GREP_BATCH_SIZE)]
+        try:
+            for i, batch in enumerate(batches):
+                pending.append(pool.submit(grep_members, pattern, flags, batch, limit))
+                while pending and (len(pending) >= window or i == len(batches) - 1):
+                    for match in pending.popleft().result():
+                        found += 1
+                        yield match
+                        if found >= limit:
+                            return
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def grep(self, arg, out=None):
+        try:
+            args = shlex.split(arg)
+            flags, limit = 0, GREP_MATCH_LIMIT
+            while args and args[0] in ("-i", "-m"):
+                option = args.pop(0)
+                if option == "-i":
+                    flags |= re.IGNORECASE
+                else:
+                    limit = int(args.pop(0))
+            if limit < 1 or not 1 <= len(args) <= 2:
+                raise ValueError(GREP_USAGE)
+            re.compile(args[0], flags)
+        except (ValueError, IndexError):
+            return self.emit("grep", [GREP_USAGE], out)
+        except re.error as e:
+            return self.emit("grep", [f"Invalid pattern: {e}"], out)
+        start = self.resolve(args[1]) if len(args) > 1 else self.current_dir
+        if self.index.find_dir(start) is None:
+            return self.emit("grep", ["Directory not found"], out)
+        return self.emit("grep", join_lines(self.iter_grep(args[0], flags, start, limit)), out)
+    
+    def stats(self):
+        output = self.image.cache.stats()
+        self.logger.log_command("stats", output)
         return output
     
     def who(self):
@@ -71,10 +1237,121 @@ class ZipShellEmulator:
         self.logger.log_command("who", output)
         return output
     
+    def touch(self, path):
+        target = self.resolve(path)
+        if self.index.find_dir(target.rpartition('/')[0]) is None or not target:
+            output = "touch: Directory not found"
+        elif self.index.find_dir(target) is not None:
+            output = "touch: Is a directory"
+        else:
+            if self.index.find_file(target) is None:
+                self.image.write_file(target, b"")
+            output = ""
+        self.logger.log_command("touch", output)
+        return output
+    
+    def mkdir(self, path):
+        target = self.resolve(path)
+        if self.index.find_dir(target.rpartition('/')[0]) is None or not target:
+            output = "mkdir: Directory not found"
+        elif self.index.find_dir(target) is not None or self.index.find_file(target) is not None:
+            output = "mkdir: File exists"
+        else:
+            self.image.make_dir(target)
+            output = ""
+        self.logger.log_command("mkdir", output)
+        return output
+    
+    def rm(self, arg):
+        recursive, _, path = arg.partition(" ") if arg.startswith("-r ") else ("", "", arg)
+        target = self.resolve(path)
+        if self.index.find_file(target) is not None:
+            self.image.remove(target)
+            output = ""
+        elif target and self.index.find_dir(target) is not None:
+            if recursive:
+                self.image.remove(target)
+                output = ""
+            else:
+                output = "rm: Is a directory"
+        else:
+            output = "rm: No such file or directory"
+        if not (self.current_dir and self.index.find_dir(self.current_dir)):
+            self.current_dir = ""
+        self.logger.log_command("rm", output)
+        return output
+    
+    def echo(self, arg):
+        position = find_unquoted(arg, ">")
+        redirect = position >= 0
+        text, target = (arg[:position], arg[position + 1:]) if redirect else (arg, "")
+        append = target.startswith(">")
+        try:
+            text = " ".join(shlex.split(text))
+            targets = shlex.split(target[1:] if append else target)
+        except ValueError as e:
+            output = f"echo: {e}"
+            self.logger.log_command("echo", output)
+            return output
+        if not redirect:
+            output = text
+        elif len(targets) != 1:
+            output = "echo: Expected one output file"
+        else:
+            target = self.resolve(targets[0])
+            info = self.index.find_file(target)
+            if self.index.find_dir(target.rpartition('/')[0]) is None or not target:
+                output = "echo: Directory not found"
+            elif self.index.find_dir(target) is not None:
+                output = "echo: Is a directory"
+            else:
+                data = (text + "\n").encode('utf-8')
+                if append and info is not None:
+                    with self.open_member(info) as f:
+                        data = f.read() + data
+                self.image.write_file(target, data)
+                output = ""
+        self.logger.log_command("echo", output)
+        return output
+    
+    def commit_error(self, path):
+        if not self.allow_commit:
+            return "commit: Disabled in server sessions"
+        if self.commit_dir is None:
+            if not path and not isinstance(self.base_image, ZipImage):
+                return "commit: An output path is required for non-ZIP images"
+            return None
+        commit_dir = os.path.realpath(self.commit_dir)
+        target = os.path.realpath(os.path.join(commit_dir, path))
+        if not path or os.path.dirname(target) != commit_dir:
+            return "commit: Output must be a file name inside the commit directory"
+        if target == os.path.realpath(self.zip_path):
+            return "commit: Cannot overwrite the served archive"
+        return None
+    
+    def commit(self, path=""):
+        output = self.commit_error(path)
+        if output is None:
+            output_path = os.path.join(self.commit_dir, path) if self.commit_dir is not None else path or self.zip_path
+            count = self.image.commit(output_path)
+            output = f"Committed {count} entries to {output_path}"
+            if os.path.abspath(output_path) == os.path.abspath(self.zip_path) and self.owns_image:
+                # The archive now contains the overlay, so start over from the new image
+                self.base_image.close()
+                self.base_image = open_image(self.zip_path, self.index_path)
+                self.image = OverlayImage(self.base_image)
+                self.index = self.image.index
+        self.logger.log_command("commit", output)
+        return output
+    
+    def close(self):
+        if self.owns_image:
+            self.base_image.close()
+    
     def exit(self):
         self.logger.log_command("exit", "Session ended")
         self.logger.save()
-        self.zip_file.close()
+        self.close()
         return "Exiting shell emulator."
 
 def load_config(config_path):
@@ -82,35 +1359,221 @@ def load_config(config_path):
         config = json.load(f)
     return config['filesystem_path'], config['log_path']
 
-def run_shell_emulator(config_path):
+def create_logger(config_path, log_path):
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    if config.get('log_mode') == 'stream':
+        return StreamingXMLLogger(
+            log_path,
+            max_bytes=config.get('log_max_bytes', 10 * 1024 * 1024),
+            backup_count=config.get('log_backup_count', 3),
+        )
+    return XMLLogger(log_path)
+
+def command_ls(emulator, arg, out):
+    print(emulator.ls(), file=out)
+
+def command_cd(emulator, arg, out):
+    print(emulator.cd(arg), file=out)
+
+def command_pwd(emulator, arg, out):
+    print(emulator.pwd(), file=out)
+
+def command_tac(emulator, arg, out):
+    emulator.tac(arg, out=out)
+    print(file=out)
+
+def command_find(emulator, arg, out):
+    emulator.find(arg, out=out)
+    print(file=out)
+
+def command_grep(emulator, arg, out):
+    emulator.grep(arg, out=out)
+    print(file=out)
+
+def command_touch(emulator, arg, out):
+    print(emulator.touch(arg), file=out)
+
+def command_mkdir(emulator, arg, out):
+    print(emulator.mkdir(arg), file=out)
+
+def command_rm(emulator, arg, out):
+    print(emulator.rm(arg), file=out)
+
+def command_echo(emulator, arg, out):
+    print(emulator.echo(arg), file=out)
+
+def command_commit(emulator, arg, out):
+    print(emulator.commit(arg), file=out)
+
+def command_stats(emulator, arg, out):
+    print(emulator.stats(), file=out)
+
+def command_who(emulator, arg, out):
+    print(emulator.who(), file=out)
+
+def command_exit(emulator, arg, out):
+    print(emulator.exit(), file=out)
+    return False
+
+# name -> (takes_argument, handler); None means the argument is optional,
+# and a handler returns False to end the session
+COMMANDS = {
+    "ls": (False, command_ls),
+    "cd": (True, command_cd),
+    "pwd": (False, command_pwd),
+    "tac": (True, command_tac),
+    "who": (False, command_who),
+    "stats": (False, command_stats),
+    "find": (None, command_find),
+    "grep": (True, command_grep),
+    "touch": (True, command_touch),
+    "mkdir": (True, command_mkdir),
+    "rm": (True, command_rm),
+    "echo": (None, command_echo),
+    "commit": (None, command_commit),
+    "exit": (False, command_exit),
+}
+
+def execute_command(emulator, command, out=sys.stdout):
+    name, _, arg = command.partition(" ")
+    entry = COMMANDS.get(name)
+    if entry is None or entry[0] is not None and entry[0] != bool(arg):
+        print("Command not found.", file=out)
+        return True
+    try:
+        return entry[1](emulator, arg, out) is not False
+    except ConnectionError:
+        raise
+    except Exception as e:
+        # A failing command (e.g. a corrupt member) is reported without ending the session
+        print(f"Error: {e}", file=out)
+        return True
+
+def read_script(script_path):
+    if script_path == "-":
+        yield from sys.stdin
+    else:
+        with open(script_path, 'r', encoding='utf-8') as f:
+            yield from f
+
+def run_shell_emulator(config_path, script_path=None):
     fs_path, log_path = load_config(config_path)
-    logger = XMLLogger(log_path)
+    logger = create_logger(config_path, log_path)
     emulator = ZipShellEmulator(fs_path, logger)
     
+    if script_path is not None:
+        # Non-interactive replay: blank lines and "#" comments are skipped
+        for line in read_script(script_path):
+            command = line.strip()
+            if command and not command.startswith("#"):
+                if not execute_command(emulator, command):
+                    return
+        execute_command(emulator, "exit")
+        return
+    
     print("Shell emulator started. Type 'exit' to quit.")
     while True:
-        command = input("> ").strip()
-        if command == "exit":
-            print(emulator.exit())
+        try:
+            command = input("> ").strip()
+        except EOFError:
+            command = "exit"
+        if not execute_command(emulator, command):
             break
-        elif command == "ls":
-            print(emulator.ls())
-        elif command.startswith("cd "):
-            path = command.split(" ", 1)[1]
-            print(emulator.cd(path))
-        elif command == "pwd":
-            print(emulator.pwd())
-        elif command.startswith("tac "):
-            filename = command.split(" ", 1)[1]
-            print(emulator.tac(filename))
-        elif command == "who":
-            print(emulator.who())
-        else:
-            print("Command not found.")
+
+class SocketOutput:
+    # File-like output for a session; writes from worker threads wait for the socket to drain
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+    
+    async def send(self, text):
+        self.writer.write(text.encode('utf-8'))
+        await self.writer.drain()
+    
+    def write(self, text):
+        asyncio.run_coroutine_threadsafe(self.send(text), self.loop).result()
+    
+    def flush(self):
+        pass
+
+class ShellServer:
+    # Serves independent sessions over TCP or a Unix socket from one shared ZipImage;
+    # commands run in a thread pool so decompression does not block the event loop
+    def __init__(self, config_path, workers=8):
+        self.config_path = config_path
+        self.fs_path, self.log_path = load_config(config_path)
+        with open(config_path, 'r') as f:
+            # Without a commit_dir in the config, sessions cannot write archives at all
+            self.commit_dir = json.load(f).get('commit_dir')
+        self.image = open_image(self.fs_path)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.session_count = 0
+    
+    def session_log_path(self, session_id):
+        root, ext = os.path.splitext(self.log_path)
+        return f"{root}.session-{session_id}{ext}"
+    
+    async def handle_session(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        self.session_count += 1
+        logger = create_logger(self.config_path, self.session_log_path(self.session_count))
+        emulator = ZipShellEmulator(
+            self.fs_path, logger, image=self.image,
+            allow_commit=self.commit_dir is not None, commit_dir=self.commit_dir,
+        )
+        out = SocketOutput(loop, writer)
+        active = True
+        try:
+            await out.send("Shell emulator started. Type 'exit' to quit.\n")
+            while active:
+                await out.send("> ")
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', errors='replace').strip()
+                active = await loop.run_in_executor(self.executor, execute_command, emulator, command, out)
+        except ConnectionError:
+            pass
+        finally:
+            if active:
+                # Client went away without "exit": still close the session log
+                await loop.run_in_executor(self.executor, execute_command, emulator, "exit", io.StringIO())
+            writer.close()
+    
+    async def start(self, address):
+        host, _, port = address.rpartition(':')
+        if port.isdigit():
+            return await asyncio.start_server(self.handle_session, host or "127.0.0.1", int(port))
+        return await asyncio.start_unix_server(self.handle_session, path=address)
+    
+    async def serve(self, address):
+        server = await self.start(address)
+        print(f"Shell server listening on {address}")
+        async with server:
+            await server.serve_forever()
+    
+    def close(self):
+        self.executor.shutdown()
+        self.image.close()
+
+def run_shell_server(config_path, address, workers=8):
+    server = ShellServer(config_path, workers)
+    try:
+        asyncio.run(server.serve(address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python shell_emulator.py <config_path>")
+    parser = argparse.ArgumentParser(description="Shell emulator over a ZIP virtual filesystem.")
+    parser.add_argument("config_path", help="Path to the JSON configuration file")
+    parser.add_argument("script_path", nargs="?", default=None, help="Script to replay instead of reading input ('-' for stdin)")
+    parser.add_argument("--serve", metavar="ADDRESS", help="Serve sessions on HOST:PORT or a Unix socket path")
+    parser.add_argument("--workers", type=int, default=8, help="Worker threads for the server mode")
+    args = parser.parse_args()
+    if args.serve:
+        run_shell_server(args.config_path, args.serve, args.workers)
     else:
-        run_shell_emulator(sys.argv[1])
+        run_shell_emulator(args.config_path, args.script_path)
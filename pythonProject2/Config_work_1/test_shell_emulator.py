@@ -1,19 +1,34 @@
 # test_shell_emulator.py
 
 import os
+import io
+import tarfile
 import zipfile
 import json
+import asyncio
 import xml.etree.ElementTree as ET
-import shutil
 from datetime import datetime
 import tempfile
 
 # Import classes and functions from shell_emulator.py
 from shell_emulator import (
     XMLLogger,
-    ShellEmulator,
-    load_config,
-    setup_virtual_filesystem
+    StreamingXMLLogger,
+    ZipShellEmulator,
+    DirectoryIndex,
+    MappedDirectoryIndex,
+    LOG_OUTPUT_LIMIT,
+    execute_command,
+    COMMANDS,
+    run_shell_emulator,
+    ShellServer,
+    MemberCache,
+    GREP_PARALLEL_THRESHOLD,
+    GREP_USAGE,
+    TarImage,
+    DirectoryImage,
+    OverlayImage,
+    load_config
 )
 
 # --------------------- XMLLogger Tests ---------------------
@@ -89,10 +104,45 @@ def test_xml_logger_save():
     os.remove(log_path)
     print("Test 2 passed.")
 
-# --------------------- ShellEmulator Tests ---------------------
+def test_streaming_xml_logger():
+    print("Testing StreamingXMLLogger...")
+
+    # Test 1: Records are flushed incrementally and the file is well-formed after save
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_path = os.path.join(temp_dir, "log.xml")
+        logger = StreamingXMLLogger(log_path, flush_every=2)
+        logger.log_command("ls", "file1\nfile2")
+        logger.log_command("pwd", "/home/user")
+        with open(log_path, 'rb') as f:
+            assert b"<name>pwd</name>" in f.read(), "Commands should be flushed before save."
+        logger.save()
+        commands = ET.parse(log_path).getroot().findall('command')
+        assert [c.find('name').text for c in commands] == ["ls", "pwd"], "Logged commands mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Commands logged after save are appended without losing earlier records
+        logger.log_command("who", "user")
+        logger.save()
+        commands = ET.parse(log_path).getroot().findall('command')
+        assert [c.find('name').text for c in commands] == ["ls", "pwd", "who"], "Records should survive a reopen."
+        print("Test 2 passed.")
+
+    # Test 3: The log rotates by size and keeps at most backup_count old files
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log_path = os.path.join(temp_dir, "log.xml")
+        logger = StreamingXMLLogger(log_path, max_bytes=300, backup_count=2)
+        for i in range(20):
+            logger.log_command("echo", f"output {i}")
+        logger.save()
+        assert sorted(os.listdir(temp_dir)) == ["log.xml", "log.xml.1", "log.xml.2"], "Rotated files mismatch."
+        for name in os.listdir(temp_dir):
+            assert ET.parse(os.path.join(temp_dir, name)).getroot().tag == "session", "Each file should be well-formed."
+        print("Test 3 passed.")
+
+# --------------------- Directory-backed ZipShellEmulator Tests ---------------------
 
 def test_shell_emulator_ls():
-    print("Testing ShellEmulator.ls...")
+    print("Testing ZipShellEmulator.ls on a directory...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
@@ -100,7 +150,7 @@ def test_shell_emulator_ls():
         with open(os.path.join(fs_root, "file1.txt"), 'w') as f:
             f.write("Content1")
         logger = XMLLogger(os.path.join(fs_root, "log.xml"))
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
         # Test 1: List contents in root
         output = emulator.ls()
@@ -115,56 +165,55 @@ def test_shell_emulator_ls():
         expected = set()
         output_set = set(output.split('\n')) if output else set()
         assert output_set == expected, "ls in empty directory should return empty set."
+        emulator.close()
         print("Test 2 passed.")
 
 def test_shell_emulator_cd():
-    print("Testing ShellEmulator.cd...")
+    print("Testing ZipShellEmulator.cd on a directory...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
         os.makedirs(os.path.join(fs_root, "dir1"))
         logger = XMLLogger(os.path.join(fs_root, "log.xml"))
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
         # Test 1: Change to existing directory
         output = emulator.cd("dir1")
-        expected = os.path.join(fs_root, "dir1")
-        assert emulator.current_dir == expected, "Current directory should be dir1."
-        assert output == f"Changed directory to {expected}", "cd output mismatch."
+        assert emulator.current_dir == "dir1/", "Current directory should be dir1."
+        assert output == "Changed directory to dir1/", "cd output mismatch."
         print("Test 1 passed.")
 
         # Test 2: Attempt to change to non-existing directory
         output = emulator.cd("nonexistent")
         assert output == "Directory not found", "Should return 'Directory not found'."
-        assert emulator.current_dir == expected, "Current directory should remain unchanged."
+        assert emulator.current_dir == "dir1/", "Current directory should remain unchanged."
+        emulator.close()
         print("Test 2 passed.")
 
 def test_shell_emulator_pwd():
-    print("Testing ShellEmulator.pwd...")
+    print("Testing ZipShellEmulator.pwd on a directory...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
         os.makedirs(os.path.join(fs_root, "dir1", "subdir"))
         logger = XMLLogger(os.path.join(fs_root, "log.xml"))
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
         # Test 1: pwd in root
         output = emulator.pwd()
-        expected = "."
-        assert output == expected, "pwd in root should return '.'."
+        assert output == "/", "pwd in root should return '/'."
         print("Test 1 passed.")
 
         # Test 2: pwd in subdirectory
         emulator.cd("dir1")
         emulator.cd("subdir")
         output = emulator.pwd()
-        # Normalize paths for cross-platform compatibility
-        normalized_output = output.replace('\\', '/')
-        assert normalized_output == "dir1/subdir", f"pwd should return 'dir1/subdir', got '{output}'."
+        assert output == "/dir1/subdir", f"pwd should return '/dir1/subdir', got '{output}'."
+        emulator.close()
         print("Test 2 passed.")
 
 def test_shell_emulator_tac():
-    print("Testing ShellEmulator.tac...")
+    print("Testing ZipShellEmulator.tac on a directory...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
@@ -172,11 +221,11 @@ def test_shell_emulator_tac():
         with open(file_path, 'w') as f:
             f.write("Line1\nLine2\nLine3\n")
         logger = XMLLogger(os.path.join(fs_root, "log.xml"))
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
-        # Test 1: tac on existing file
+        # Test 1: tac on existing file reverses the whole text, like the ZIP-backed emulator
         output = emulator.tac("file.txt")
-        expected = "Line3\nLine2\nLine1\n"
+        expected = "\n3eniL\n2eniL\n1eniL"
         assert output == expected, f"tac output mismatch. Expected '{expected}', got '{output}'."
         print("Test 1 passed.")
 
@@ -184,15 +233,16 @@ def test_shell_emulator_tac():
         output = emulator.tac("nonexistent.txt")
         expected = "File not found"
         assert output == expected, "tac should return 'File not found' for missing file."
+        emulator.close()
         print("Test 2 passed.")
 
 def test_shell_emulator_who():
-    print("Testing ShellEmulator.who...")
+    print("Testing ZipShellEmulator.who...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
         logger = XMLLogger(os.path.join(fs_root, "log.xml"))
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
         # Test 1: who returns the current user
         try:
@@ -213,15 +263,16 @@ def test_shell_emulator_who():
             print("Test 2 passed.")
         finally:
             os.getlogin = original_getlogin
+            emulator.close()
 
 def test_shell_emulator_exit():
-    print("Testing ShellEmulator.exit...")
+    print("Testing ZipShellEmulator.exit...")
 
     # Setup temporary filesystem
     with tempfile.TemporaryDirectory() as fs_root:
         log_path = os.path.join(fs_root, "log.xml")
         logger = XMLLogger(log_path)
-        emulator = ShellEmulator(fs_root, logger)
+        emulator = ZipShellEmulator(fs_root, logger)
 
         # Test: Exit logs the exit command and saves the log
         exit_message = emulator.exit()
@@ -236,6 +287,475 @@ def test_shell_emulator_exit():
         assert commands[0].find('output').text == "Session ended", "Exit command output mismatch."
         print("Test passed.")
 
+# --------------------- ZipShellEmulator Tests ---------------------
+
+def make_test_zip(temp_dir, members):
+    zip_path = os.path.join(temp_dir, "test.zip")
+    with zipfile.ZipFile(zip_path, 'w') as zipf:
+        for name, content in members.items():
+            zipf.writestr(name, content)
+    return zip_path
+
+def test_directory_index():
+    print("Testing DirectoryIndex...")
+
+    # Test 1: Implicit directories are created from member paths
+    index = DirectoryIndex(zipfile.ZipInfo(name) for name in ["a/b/c.txt", "a/d.txt", "e/"])
+    assert index.listdir("") == ["a", "e"], "Root should contain 'a' and 'e'."
+    assert index.listdir("a/") == ["b", "d.txt"], "'a' should contain 'b' and 'd.txt'."
+    assert index.find_dir("a/b") is not None, "Implicit directory 'a/b' should resolve."
+    print("Test 1 passed.")
+
+    # Test 2: Missing directories and files are not directories
+    assert index.find_dir("x") is None, "Missing directory should not resolve."
+    assert index.find_dir("a/d.txt") is None, "A file should not resolve as a directory."
+    assert index.listdir("x") == [], "Listing a missing directory should be empty."
+    print("Test 2 passed.")
+
+def test_zip_shell_emulator_ls_cd():
+    print("Testing ZipShellEmulator.ls and ZipShellEmulator.cd...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {
+            "vfs/home/user1/file1.txt": "Content1",
+            "vfs/etc/config.cfg": "Content2",
+        })
+        logger = XMLLogger(os.path.join(temp_dir, "log.xml"))
+        emulator = ZipShellEmulator(zip_path, logger)
+
+        # Test 1: cd into implicit directories and list them
+        assert emulator.ls() == "vfs", "Root should contain only 'vfs'."
+        output = emulator.cd("vfs/home")
+        assert output == "Changed directory to vfs/home/", "cd output mismatch."
+        assert emulator.ls() == "user1", "ls output mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Relative, parent and missing paths
+        emulator.cd("../etc")
+        assert emulator.current_dir == "vfs/etc/", "Current directory should be vfs/etc/."
+        assert emulator.cd("missing") == "Directory not found", "Should return 'Directory not found'."
+        assert emulator.cd("config.cfg") == "Directory not found", "A file is not a directory."
+        emulator.cd("/")
+        assert emulator.current_dir == "", "cd / should return to the root."
+        emulator.close()
+        print("Test 2 passed.")
+
+def test_zip_shell_emulator_index_cache():
+    print("Testing ZipShellEmulator index cache...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {
+            "vfs/notes.txt": "Line1\nLine2\n",
+            "vfs/empty/": "",
+        })
+        logger = XMLLogger(os.path.join(temp_dir, "log.xml"))
+
+        # Test 1: First start writes the sidecar, second start memory-maps it
+        emulator = ZipShellEmulator(zip_path, logger)
+        emulator.close()
+        assert os.path.exists(zip_path + ".idx"), "Sidecar index should be written."
+        emulator = ZipShellEmulator(zip_path, logger)
+        assert isinstance(emulator.base_image.index, MappedDirectoryIndex), "Index should be loaded from the sidecar."
+        emulator.cd("vfs")
+        assert emulator.ls() == "empty\nnotes.txt", "ls output mismatch."
+        assert emulator.tac("notes.txt") == "\n2eniL\n1eniL", "tac output mismatch."
+        emulator.close()
+        print("Test 1 passed.")
+
+        # Test 2: Changing the archive invalidates the sidecar
+        with zipfile.ZipFile(zip_path, 'a') as zipf:
+            zipf.writestr("vfs/new.txt", "New")
+        emulator = ZipShellEmulator(zip_path, logger)
+        assert not isinstance(emulator.base_image.index, MappedDirectoryIndex), "Stale sidecar should be rebuilt."
+        assert emulator.index.find_file("vfs/new.txt") is not None, "New member should be indexed."
+        emulator.close()
+        print("Test 2 passed.")
+
+def test_zip_shell_emulator_tac_streaming():
+    print("Testing ZipShellEmulator.tac streaming...")
+
+    text = "".join(f"строка {i}\n" for i in range(50000))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "test.zip")
+        with zipfile.ZipFile(zip_path, 'w') as zipf:
+            zipf.writestr("stored.txt", text, compress_type=zipfile.ZIP_STORED)
+            zipf.writestr("deflated.txt", text, compress_type=zipfile.ZIP_DEFLATED)
+            zipf.writestr("lzma.txt", text, compress_type=zipfile.ZIP_LZMA)
+        logger = XMLLogger(os.path.join(temp_dir, "log.xml"))
+        emulator = ZipShellEmulator(zip_path, logger)
+
+        # Test 1: Multi-byte characters survive block boundaries for every compression method
+        assert emulator.tac("stored.txt") == text[::-1], "Stored member tac mismatch."
+        assert emulator.tac("deflated.txt") == text[::-1], "Deflated member tac mismatch."
+        assert emulator.tac("lzma.txt") == text[::-1], "LZMA member tac mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Streaming to an output writes everything but logs only an excerpt
+        out = io.StringIO()
+        output = emulator.tac("deflated.txt", out=out)
+        assert out.getvalue() == text[::-1], "Streamed tac output mismatch."
+        assert len(output) <= LOG_OUTPUT_LIMIT + 3, "Logged tac output should be truncated."
+        emulator.close()
+        print("Test 2 passed.")
+
+def test_execute_command():
+    print("Testing execute_command...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {"vfs/file.txt": "abc"})
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+
+        # Test 1: Known commands are dispatched through the table
+        out = io.StringIO()
+        assert execute_command(emulator, "cd vfs", out), "cd should not end the session."
+        execute_command(emulator, "tac file.txt", out)
+        assert out.getvalue() == "Changed directory to vfs/\ncba\n", "Dispatched output mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Unknown commands and wrong arguments; exit ends the session
+        out = io.StringIO()
+        execute_command(emulator, "mv file.txt", out)
+        execute_command(emulator, "ls extra", out)
+        assert out.getvalue() == "Command not found.\nCommand not found.\n", "Unknown command output mismatch."
+        print("Test 2 passed.")
+
+        # Test 3: A failing command is reported and the session continues; exit ends it
+        emulator.index.find_file("vfs/file.txt").compress_type = 99
+        out = io.StringIO()
+        assert execute_command(emulator, "tac file.txt", out), "A failing command should not end the session."
+        assert out.getvalue() == "Error: Unsupported compression method: 99\n", "Error output mismatch."
+        assert not execute_command(emulator, "exit", out), "exit should end the session."
+        print("Test 3 passed.")
+
+def test_run_shell_emulator_script():
+    print("Testing run_shell_emulator with a script...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {"vfs/home/file.txt": "abc"})
+        log_path = os.path.join(temp_dir, "log.xml")
+        config_path = os.path.join(temp_dir, "config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"filesystem_path": zip_path, "log_path": log_path}, f)
+        script_path = os.path.join(temp_dir, "session.txt")
+        with open(script_path, 'w') as f:
+            f.write("# replayed session\ncd vfs/home\n\npwd\n")
+
+        # Test: Commands are replayed and the session is closed without an explicit exit
+        run_shell_emulator(config_path, script_path)
+        names = [c.find('name').text for c in ET.parse(log_path).getroot().findall('command')]
+        assert names == ["cd", "pwd", "exit"], f"Replayed commands mismatch: {names}."
+        print("Test passed.")
+
+def test_shell_server_sessions():
+    print("Testing ShellServer...")
+
+    async def read_reply(reader):
+        data = await reader.readuntil(b"> ")
+        return data[:-2].decode('utf-8')
+
+    async def scenario(shell_server, zip_path):
+        server = await shell_server.start("127.0.0.1:0")
+        port = server.sockets[0].getsockname()[1]
+        first = await asyncio.open_connection("127.0.0.1", port)
+        second = await asyncio.open_connection("127.0.0.1", port)
+        await read_reply(first[0])
+        await read_reply(second[0])
+
+        # Test 1: Each session keeps its own current directory
+        first[1].write(b"cd vfs/home\n")
+        assert await read_reply(first[0]) == "Changed directory to vfs/home/\n", "cd reply mismatch."
+        second[1].write(b"pwd\n")
+        assert await read_reply(second[0]) == "/\n", "Second session should stay in the root."
+        first[1].write(b"tac file.txt\n")
+        assert await read_reply(first[0]) == "cba\n", "tac reply mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: A failing command is reported and the session keeps running
+        second[1].write(b'echo "abc\n')
+        assert await read_reply(second[0]) == "echo: No closing quotation\n", "echo error reply mismatch."
+        original_who = COMMANDS["who"]
+        COMMANDS["who"] = (False, lambda emulator, arg, out: 1 / 0)
+        try:
+            second[1].write(b"who\n")
+            assert await read_reply(second[0]) == "Error: division by zero\n", "Command errors should be reported."
+        finally:
+            COMMANDS["who"] = original_who
+        second[1].write(b"pwd\n")
+        assert await read_reply(second[0]) == "/\n", "Session should survive a failing command."
+        second[1].write(b"commit " + zip_path.encode('utf-8') + b"\n")
+        assert await read_reply(second[0]) == "commit: Disabled in server sessions\n", "Server commit should be disabled."
+        print("Test 2 passed.")
+
+        # Test 3: exit and a dropped connection both close the session logs
+        first[1].write(b"exit\n")
+        await first[0].read()
+        second[1].close()
+        await asyncio.sleep(0.2)
+        server.close()
+        await server.wait_closed()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {"vfs/home/file.txt": "abc"})
+        config_path = os.path.join(temp_dir, "config.json")
+        with open(config_path, 'w') as f:
+            json.dump({"filesystem_path": zip_path, "log_path": os.path.join(temp_dir, "log.xml")}, f)
+        shell_server = ShellServer(config_path, workers=2)
+        asyncio.run(scenario(shell_server, zip_path))
+        shell_server.close()
+        for session_id in (1, 2):
+            log_path = os.path.join(temp_dir, f"log.session-{session_id}.xml")
+            names = [c.find('name').text for c in ET.parse(log_path).getroot().findall('command')]
+            assert names[-1] == "exit", f"Session {session_id} log should end with exit."
+        print("Test 3 passed.")
+
+def test_member_cache():
+    print("Testing MemberCache...")
+
+    # Test 1: Least recently used entries are evicted once the byte budget is exceeded
+    cache = MemberCache(max_bytes=10, max_entry_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234", "Cached entry should be returned."
+    cache.put("c", b"90ab")
+    assert cache.get("b") is None, "Least recently used entry should be evicted."
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 1, 1), "Cache counters mismatch."
+    print("Test 1 passed.")
+
+    # Test 2: Entries larger than max_entry_bytes are never cached
+    cache.put("d", b"x" * 11)
+    assert cache.get("d") is None and cache.size == 8, "Oversized entry should not be cached."
+    print("Test 2 passed.")
+
+def test_zip_shell_emulator_stats():
+    print("Testing ZipShellEmulator.stats...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "test.zip")
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr("config.cfg", "a=1\nb=2\n")
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+
+        # Test: Repeated tac on the same member is served from the cache
+        first = emulator.tac("config.cfg")
+        second = emulator.tac("config.cfg")
+        assert first == second, "Cached tac output should match."
+        assert emulator.stats().startswith("hits: 1\nmisses: 1\n"), "stats should report one hit and one miss."
+        emulator.close()
+        print("Test passed.")
+
+def test_zip_shell_emulator_find():
+    print("Testing ZipShellEmulator.find...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {
+            "vfs/etc/config.cfg": "x" * 2048,
+            "vfs/var/log/system.log": "boot",
+            "vfs/var/log/old.log": "",
+        })
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+
+        # Test 1: Name globs and type filters walk the directory index
+        assert emulator.find("-name *.log") == "/vfs/var/log/old.log\n/vfs/var/log/system.log", "find -name mismatch."
+        emulator.cd("vfs")
+        assert emulator.find("var -type d") == "/vfs/var/log", "find -type d mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Size filters and invalid arguments
+        assert emulator.find("-size +1k") == "/vfs/etc/config.cfg", "find -size mismatch."
+        assert emulator.find("-size huge").startswith("Invalid size"), "Invalid size should be reported."
+        assert emulator.find("missing") == "Directory not found", "Missing start directory should be reported."
+        emulator.close()
+        print("Test 2 passed.")
+
+def test_zip_shell_emulator_grep():
+    print("Testing ZipShellEmulator.grep...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        members = {f"logs/app{i:03}.log": f"start\nERROR {i}\nstop\n" for i in range(GREP_PARALLEL_THRESHOLD * 2)}
+        members["etc/config.cfg"] = "error=1\n"
+        zip_path = make_test_zip(temp_dir, members)
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+
+        # Test 1: Small searches run in-process
+        assert emulator.grep("-i error etc") == "/etc/config.cfg:1:error=1", "In-process grep mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Large searches run in the process pool, keep archive order and stop at the limit
+        output = emulator.grep("-m 3 ERROR logs").split("\n")
+        assert output == [f"/logs/app{i:03}.log:2:ERROR {i}" for i in range(3)], "Parallel grep mismatch."
+        assert len(emulator.grep("ERROR").split("\n")) == GREP_PARALLEL_THRESHOLD * 2, "All matches should be found."
+        assert emulator.grep("(").startswith("Invalid pattern"), "Invalid pattern should be reported."
+        assert emulator.grep("-m 0 ERROR") == GREP_USAGE, "A zero limit should be rejected."
+        assert emulator.grep("-m -1 error etc") == GREP_USAGE, "A negative limit should be rejected."
+        emulator.close()
+        print("Test 2 passed.")
+
+def make_test_tar(tar_path, members, mode):
+    with tarfile.open(tar_path, mode) as tar:
+        for name, content in members.items():
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def test_tar_image():
+    print("Testing TarImage...")
+
+    members = {f"vfs/logs/app{i}.log": f"line {i}\n" * (i * 40) for i in range(50)}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Test 1: Uncompressed tar members are read in place by data offset
+        tar_path = os.path.join(temp_dir, "vfs.tar")
+        make_test_tar(tar_path, members, "w")
+        emulator = ZipShellEmulator(tar_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+        assert isinstance(emulator.base_image, TarImage), "A .tar archive should use TarImage."
+        emulator.cd("vfs/logs")
+        assert emulator.tac("app7.log") == members["vfs/logs/app7.log"][::-1], "tar tac mismatch."
+        emulator.close()
+        print("Test 1 passed.")
+
+        # Test 2: Gzip members are read by resuming from the nearest checkpoint
+        tar_path = os.path.join(temp_dir, "vfs.tar.gz")
+        make_test_tar(tar_path, members, "w:gz")
+        image = TarImage(tar_path, checkpoint_interval=16 * 1024)
+        assert len(image.checkpoints) > 1, "Checkpoints should be recorded while indexing."
+        emulator = ZipShellEmulator(tar_path, XMLLogger(os.path.join(temp_dir, "log.xml")), image=image)
+        for name in ("vfs/logs/app49.log", "vfs/logs/app3.log"):
+            assert emulator.tac(name) == members[name][::-1], f"tar.gz tac mismatch for {name}."
+        assert emulator.ls() == "vfs", "ls output mismatch."
+        image.close()
+        print("Test 2 passed.")
+
+def test_directory_image():
+    print("Testing DirectoryImage...")
+
+    with tempfile.TemporaryDirectory() as fs_root:
+        os.makedirs(os.path.join(fs_root, "dir1", "empty"))
+        with open(os.path.join(fs_root, "dir1", "file.txt"), 'w') as f:
+            f.write("Line1\nLine2\n")
+        emulator = ZipShellEmulator(fs_root, XMLLogger(os.path.join(fs_root, "log.xml")))
+
+        # Test: A plain directory is served through the same commands
+        assert isinstance(emulator.base_image, DirectoryImage), "A directory should use DirectoryImage."
+        emulator.cd("dir1")
+        assert emulator.ls() == "empty\nfile.txt", "ls output mismatch."
+        assert emulator.tac("file.txt") == "\n2eniL\n1eniL", "tac output mismatch."
+        assert emulator.cd("empty") == "Changed directory to dir1/empty/", "Empty directories should be indexed."
+        emulator.close()
+        print("Test passed.")
+
+def test_zip_shell_emulator_overlay():
+    print("Testing ZipShellEmulator overlay...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = make_test_zip(temp_dir, {"dir1/a.txt": "A\n", "dir1/b.txt": "B\n", "top.txt": "T\n"})
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+        assert isinstance(emulator.image, OverlayImage), "Sessions should write to an overlay."
+
+        # Test 1: New directories and files appear in the merged view
+        assert emulator.mkdir("new") == "", "mkdir should succeed."
+        assert emulator.mkdir("new") == "mkdir: File exists", "mkdir should reject existing paths."
+        assert emulator.echo("hello world > new/f.txt") == "", "echo redirection should succeed."
+        assert emulator.echo("again >> new/f.txt") == "", "echo append should succeed."
+        assert emulator.echo('"abc') == "echo: No closing quotation", "echo should report unbalanced quotes."
+        assert emulator.echo('"a > b"') == "a > b", "A quoted '>' should not redirect."
+        assert emulator.echo("'x>y' > 'new/my file'") == "", "Quoted targets should be accepted."
+        assert emulator.tac("new/my file") == "\ny>x", "Quoted text should be written unchanged."
+        assert emulator.echo("a > b c") == "echo: Expected one output file", "Extra targets should be rejected."
+        assert emulator.rm("new/my file") == "", "rm should remove the quoted-name file."
+        assert emulator.tac("new/f.txt") == "\nniaga\ndlrow olleh", "tac should read overlay files."
+        assert emulator.touch("new/empty") == "", "touch should create an empty file."
+        emulator.cd("new")
+        assert emulator.ls() == "empty\nf.txt", "ls should list overlay files."
+        print("Test 1 passed.")
+
+        # Test 2: Removals hide base members without touching the archive
+        emulator.cd("/")
+        assert emulator.rm("dir1/a.txt") == "", "rm should remove a file."
+        assert emulator.rm("dir1") == "rm: Is a directory", "rm without -r should keep directories."
+        assert emulator.rm("missing") == "rm: No such file or directory", "rm should report missing paths."
+        assert emulator.find() == "/dir1\n/dir1/b.txt\n/new\n/new/empty\n/new/f.txt\n/top.txt", "find should see the merged tree."
+        assert emulator.rm("-r dir1") == "", "rm -r should remove a directory."
+        assert emulator.mkdir("dir1") == "", "A removed directory can be re-created."
+        assert emulator.cd("dir1") == "Changed directory to dir1/", "cd mismatch."
+        assert emulator.ls() == "", "A re-created directory should not show base members."
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert len(zipf.namelist()) == 3, "The archive should not be modified before commit."
+        emulator.close()
+        print("Test 2 passed.")
+
+def test_zip_shell_emulator_commit():
+    print("Testing ZipShellEmulator commit...")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        zip_path = os.path.join(temp_dir, "test.zip")
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            zipf.writestr("dir1/keep.txt", "keep me\n" * 1000)
+            zipf.writestr("dir1/drop.txt", "drop me\n")
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+        emulator.rm("dir1/drop.txt")
+        emulator.echo("новый > dir1/new.txt")
+
+        # Test 1: The new archive contains the merged tree
+        out_path = os.path.join(temp_dir, "out.zip")
+        assert emulator.commit(out_path) == f"Committed 3 entries to {out_path}", "commit output mismatch."
+        with zipfile.ZipFile(out_path) as zipf:
+            assert zipf.testzip() is None, "Committed archive should pass CRC checks."
+            assert zipf.namelist() == ["dir1/", "dir1/keep.txt", "dir1/new.txt"], "Committed members mismatch."
+            assert zipf.read("dir1/new.txt").decode('utf-8') == "новый\n", "New member content mismatch."
+        print("Test 1 passed.")
+
+        # Test 2: Unchanged members are copied without recompression
+        def raw_member(path, name):
+            with zipfile.ZipFile(path) as zipf:
+                info = zipf.getinfo(name)
+            with open(path, 'rb') as f:
+                f.seek(info.header_offset + 30 + len(info.filename))
+                return f.read(info.compress_size)
+        assert raw_member(zip_path, "dir1/keep.txt") == raw_member(out_path, "dir1/keep.txt"), \
+            "Unchanged member bytes should be copied verbatim."
+        print("Test 2 passed.")
+
+        # Test 3: Committing in place reopens the archive with a clean overlay
+        emulator.commit()
+        assert not emulator.image.dirty, "Overlay should be empty after an in-place commit."
+        emulator.cd("dir1")
+        assert emulator.ls() == "keep.txt\nnew.txt", "Reopened archive should contain the committed tree."
+        emulator.close()
+        print("Test 3 passed.")
+
+        # Test 4: A file written over a removed directory keeps the directory's members hidden
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")))
+        assert emulator.rm("-r dir1") == "", "rm -r should remove a directory."
+        assert emulator.echo("hi > dir1") == "", "echo should create a file in place of the directory."
+        assert emulator.ls() == "dir1", "ls should list only the new file."
+        assert emulator.cd("dir1") == "Directory not found", "The removed directory should stay hidden."
+        assert emulator.find() == "/dir1", "find should list the new file once."
+        assert emulator.tac("dir1") == "\nih", "tac should read the new file."
+        out_path = os.path.join(temp_dir, "replaced.zip")
+        assert emulator.commit(out_path) == f"Committed 1 entries to {out_path}", "commit output mismatch."
+        with zipfile.ZipFile(out_path) as zipf:
+            assert zipf.namelist() == ["dir1"], "Only the new file should be committed."
+            assert zipf.read("dir1") == b"hi\n", "Committed file content mismatch."
+        emulator.close()
+        print("Test 4 passed.")
+
+        # Test 5: With a commit directory, commit only writes new files inside it
+        commit_dir = os.path.join(temp_dir, "commits")
+        os.makedirs(commit_dir)
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")), commit_dir=commit_dir)
+        outside = "commit: Output must be a file name inside the commit directory"
+        assert emulator.commit() == outside, "commit without a name should be refused."
+        assert emulator.commit("../escape.zip") == outside, "commit outside the directory should be refused."
+        assert emulator.commit(zip_path) == outside, "An absolute path should be refused."
+        expected = f"Committed 3 entries to {os.path.join(commit_dir, 'snapshot.zip')}"
+        assert emulator.commit("snapshot.zip") == expected, "commit into the directory should succeed."
+        emulator.close()
+        emulator = ZipShellEmulator(zip_path, XMLLogger(os.path.join(temp_dir, "log.xml")), commit_dir=temp_dir)
+        assert emulator.commit("test.zip") == "commit: Cannot overwrite the served archive", \
+            "The served archive should not be overwritten."
+        emulator.close()
+        print("Test 5 passed.")
+
 # --------------------- load_config Tests ---------------------
 
 def test_load_config():
@@ -271,47 +791,32 @@ def test_load_config():
     finally:
         os.remove(config_path)
 
-# --------------------- setup_virtual_filesystem Tests ---------------------
-
-def test_setup_virtual_filesystem():
-    print("Testing setup_virtual_filesystem...")
-
-    # Test 1: Valid zip extraction
-    with tempfile.TemporaryDirectory() as temp_dir:
-        zip_path = os.path.join(temp_dir, "test.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            zipf.writestr("file1.txt", "Content1")
-            zipf.writestr("dir1/file2.txt", "Content2")
-
-        fs_root = setup_virtual_filesystem(zip_path)
-        assert os.path.exists(fs_root), "Filesystem root should exist."
-        assert os.path.isfile(os.path.join(fs_root, "file1.txt")), "file1.txt should exist."
-        assert os.path.isfile(os.path.join(fs_root, "dir1", "file2.txt")), "dir1/file2.txt should exist."
-        shutil.rmtree(fs_root)
-        print("Test 1 passed.")
-
-    # Test 2: Invalid zip file
-    with tempfile.TemporaryDirectory() as temp_dir:
-        invalid_zip_path = os.path.join(temp_dir, "invalid.zip")
-        with open(invalid_zip_path, 'w') as f:
-            f.write("Not a zip file")
-        try:
-            setup_virtual_filesystem(invalid_zip_path)
-            assert False, "Should have raised a zipfile.BadZipFile exception."
-        except zipfile.BadZipFile:
-            print("Test 2 passed.")
-
 # --------------------- Running All Tests ---------------------
 
 if __name__ == "__main__":
     test_xml_logger_log_command()
     test_xml_logger_save()
+    test_streaming_xml_logger()
     test_shell_emulator_ls()
     test_shell_emulator_cd()
     test_shell_emulator_pwd()
     test_shell_emulator_tac()
     test_shell_emulator_who()
-    test_shell_emulator_exit()  # Only exit test is present
+    test_shell_emulator_exit()
+    test_directory_index()
+    test_zip_shell_emulator_ls_cd()
+    test_zip_shell_emulator_index_cache()
+    test_zip_shell_emulator_tac_streaming()
+    test_execute_command()
+    test_run_shell_emulator_script()
+    test_shell_server_sessions()
+    test_member_cache()
+    test_zip_shell_emulator_stats()
+    test_zip_shell_emulator_find()
+    test_zip_shell_emulator_grep()
+    test_tar_image()
+    test_directory_image()
+    test_zip_shell_emulator_overlay()
+    test_zip_shell_emulator_commit()
     test_load_config()
-    test_setup_virtual_filesystem()
     print("All tests completed successfully.")
@@ -0,0 +1,162 @@
+# benchmark_dependency_visualizer.py
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tarfile
+import platform
+import resource
+import tempfile
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+
+from dependency_visualizer import parse_dependencies, generate_dot, save_dot_to_file, render_graph
+
+ROOT_PACKAGE = "bench-root"
+
+
+def add_tar_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def make_synthetic_repository(repo_dir, nodes, fanout, cycle_density, seed=0):
+    """
+    Создаёт в repo_dir детерминированный репозиторий: APKINDEX.tar.gz на nodes пакетов
+    и корневой bench-root.apk. Пакет i зависит от i + 1 (все пакеты достижимы из корня)
+    и ещё от fanout - 1 случайных пакетов с большими номерами; с вероятностью cycle_density
+    добавляется обратное ребро к пакету с меньшим номером, замыкающее цикл.
+    Половина зависимостей записывается через so:-имена, как в настоящих индексах.
+    Возвращает (путь к APK, число рёбер).
+    """
+    rng = random.Random(seed)
+    records, edges = [], 0
+    for i in range(nodes):
+        targets = {i + 1} if i + 1 < nodes else set()
+        if i + 2 < nodes:
+            targets.update(rng.randrange(i + 2, nodes) for _ in range(fanout - 1))
+        if i and rng.random() < cycle_density:
+            targets.add(rng.randrange(i))
+        edges += len(targets)
+        depends = " ".join(f"so:libpkg{t}.so.1" if t % 2 else f"pkg{t}>=1.0" for t in sorted(targets))
+        records.append(f"C:Q1{i:x}=\nP:pkg{i}\nV:1.{i % 100}-r0\nD:{depends}\np:so:libpkg{i}.so.1\n\n")
+
+    with tarfile.open(os.path.join(repo_dir, "APKINDEX.tar.gz"), "w:gz") as tar:
+        add_tar_member(tar, "APKINDEX", "".join(records).encode("utf-8"))
+    package_path = os.path.join(repo_dir, f"{ROOT_PACKAGE}.apk")
+    with tarfile.open(package_path, "w:gz") as tar:
+        add_tar_member(tar, ".PKGINFO", f"pkgname = {ROOT_PACKAGE}\ndepend = pkg0\n".encode("utf-8"))
+    return package_path, edges + 1
+
+
+def measure(function, *args, memory=False):
+    """Выполняет function(*args) и возвращает (результат, секунды, пик памяти Python в байтах или None)."""
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_pipeline(repo_dir, package_path, graphviz_path, render, memory):
+    """
+    Прогоняет конвейер parse_dependencies (без кэша и с кэшем) -> generate_dot -> save_dot_to_file
+    -> render_graph во временном каталоге. Возвращает (граф, {этап: (секунды, пик памяти)}).
+    """
+    stages = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache_dir = os.path.join(work_dir, "cache")
+        for stage in ("parse_cold", "parse_warm"):
+            dependencies, elapsed, peak = measure(parse_dependencies, package_path, repo_dir, cache_dir, memory=memory)
+            stages[stage] = (elapsed, peak)
+        dot, *stages["generate_dot"] = measure(generate_dot, dependencies, memory=memory)
+        output_path = os.path.join(work_dir, "graph.png")
+        dot_path, *stages["save_dot"] = measure(save_dot_to_file, dot, output_path, memory=memory)
+        if render:
+            # Память Graphviz учитывается отдельно, через ru_maxrss дочерних процессов
+            _, *stages["render_graph"] = measure(render_graph, dot_path, graphviz_path, output_path)
+    return dependencies, stages
+
+
+def run_benchmark(nodes, fanout, cycle_density, seed, graphviz_path, render_limit):
+    """Замеряет все этапы на одном синтетическом репозитории и возвращает результат для JSON."""
+    with tempfile.TemporaryDirectory() as repo_dir:
+        started = time.perf_counter()
+        package_path, edges = make_synthetic_repository(repo_dir, nodes, fanout, cycle_density, seed)
+        print(f"\n{nodes} пакетов, {edges} рёбер (репозиторий создан за {time.perf_counter() - started:.1f} с)")
+
+        render = graphviz_path is not None and nodes <= render_limit
+        # Время и память замеряются отдельными прогонами: tracemalloc заметно замедляет выделение памяти
+        dependencies, timings = run_pipeline(repo_dir, package_path, graphviz_path, render, memory=False)
+        _, memory = run_pipeline(repo_dir, package_path, graphviz_path, False, memory=True)
+
+    stages = {}
+    for stage, (elapsed, _) in timings.items():
+        peak = memory[stage][1] if stage in memory else None
+        stages[stage] = {"seconds": round(elapsed, 6), "peak_bytes": peak}
+        peak_text = f"{peak / 2 ** 20:8.1f} МиБ" if peak is not None else "       -"
+        print(f"  {stage:<13} {elapsed * 1000:10.1f} мс  пик {peak_text}")
+    if not render:
+        print("  render_graph пропущен: " + ("Graphviz не найден" if graphviz_path is None
+                                             else f"больше {render_limit} узлов"))
+    return {
+        "nodes": nodes,
+        "fanout": fanout,
+        "cycle_density": cycle_density,
+        "seed": seed,
+        "edges": edges,
+        "reachable": len(dependencies),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер этапов визуализатора зависимостей на синтетических репозиториях.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Число пакетов в синтетических репозиториях")
+    parser.add_argument("--fanout", type=int, default=4, help="Число зависимостей у пакета")
+    parser.add_argument("--cycle-density", type=float, default=0.01,
+                        help="Доля пакетов с обратным ребром, образующим цикл")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора репозиториев")
+    parser.add_argument("--graphviz", default=shutil.which("dot"), help="Путь к Graphviz (dot)")
+    parser.add_argument("--render-limit", type=int, default=2_000,
+                        help="Рендерить графы не больше этого числа узлов")
+    parser.add_argument("--label", help="Метка версии для сравнения результатов между версиями")
+    parser.add_argument("--output", help="Файл для результатов в формате JSON")
+    args = parser.parse_args()
+
+    runs = [
+        run_benchmark(nodes, args.fanout, args.cycle_density, args.seed, args.graphviz, args.render_limit)
+        for nodes in args.sizes
+    ]
+    rendered = any("render_graph" in run["stages"] for run in runs)
+    result = {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        # ru_maxrss в Linux указывается в КиБ
+        "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "graphviz_max_rss_kib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if rendered else None,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены: {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,178 @@
 import os
+import re
+import mmap
+import gzip
+import codecs
+import shutil
+import struct
+import time
+import hashlib
+import tarfile
+import tempfile
+import fnmatch
+import contextlib
+import functools
+import itertools
+import json
+import html
+from xml.sax.saxutils import escape, quoteattr
+from concurrent.futures import ThreadPoolExecutor
+from array import array
 import configparser
 import subprocess
+import urllib.parse
+import urllib.request
 from pathlib import Path
 import argparse
 
 
+INDEX_NAME = "APKINDEX.tar.gz"
+READ_CHUNK_SIZE = 1024 * 1024
+# Конфликты (!name) и ограничения версий (name>=1.2, name~1.2, name=1.2 и т.п.)
+CONSTRAINT_RE = re.compile(r"[!<>=~]\S*")
+# Зависимости с ограничением версии в поле D: (name>=1.2, name~1.2); конфликты !name пропускаются
+CONSTRAINED_RE = re.compile(r"(?:^|(?<=\s))([^\s!<>=~][^\s<>=~]*)([<>=~]+)(\S+)")
+# Версия apk: 1.2.3a_rc1-r0
+VERSION_RE = re.compile(r"^(\d+(?:\.\d+)*)([a-z]?)((?:_[a-z]+\d*)*)(?:-r(\d+))?$")
+VERSION_SUFFIXES = {"alpha": -4, "beta": -3, "pre": -2, "rc": -1, "cvs": 1, "svn": 2, "git": 3, "hg": 4, "p": 5}
+
+DEFAULT_CACHE_DIR = str(Path.home() / ".cache" / "dependency_visualizer")
+# Кэш графа: заголовок, массивы прямого и обратного CSR и псевдонимов (uint32),
+# затем имена пакетов и псевдонимов через "\n"
+CACHE_MAGIC = b"DEPGRF02"
+CACHE_HEADER = struct.Struct("<8s32s5I")
+
+RENDER_WORKERS = 4
+# Тайм-аут (в секундах) для dot на больших графах, после которого используется sfdp
+RENDER_TIMEOUT = 60
+SFDP_THRESHOLD = 1000
+# Цвета узлов по глубине от корня; более глубокие узлы получают последний цвет
+DEPTH_COLORS = ("#f46d43", "#fdae61", "#fee08b", "#d9ef8b", "#a6d96a", "#66bd63")
+# Идентификаторы узлов в начале оператора DOT: "a" или "a" -> "b"
+DOT_NODE_RE = re.compile(r'^\s*"((?:[^"\\]|\\.)*)"(?:\s*->\s*"((?:[^"\\]|\\.)*)")?')
+# Самодостаточная HTML-страница для iter_html: данные графа подставляются вместо /*GRAPH*/,
+# раскладка — силовой алгоритм с отталкиванием по сетке, чтобы шаг оставался почти линейным
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+  html, body { margin: 0; height: 100%; overflow: hidden; font: 12px sans-serif; }
+  canvas { display: block; cursor: grab; }
+  #info { position: fixed; left: 8px; top: 8px; background: #fffd; padding: 4px 8px; border-radius: 4px; }
+</style>
+</head>
+<body>
+<div id="info">{title}</div>
+<canvas id="graph"></canvas>
+<script>
+const graph = /*GRAPH*/;
+const nodes = graph.nodes, n = nodes.length, K = 30, CELL = 2 * K;
+const edges = [];
+nodes.forEach((node, i) => node.deps.forEach(j => edges.push(i, j)));
+const x = new Float64Array(n), y = new Float64Array(n), vx = new Float64Array(n), vy = new Float64Array(n);
+const spread = Math.sqrt(n) * K;
+for (let i = 0; i < n; i++) {
+  const angle = i * 2.399963, radius = spread * Math.sqrt(i / n);
+  x[i] = radius * Math.cos(angle);
+  y[i] = radius * Math.sin(angle);
+}
+const canvas = document.getElementById("graph"), ctx = canvas.getContext("2d"), info = document.getElementById("info");
+let scale = Math.min(1, 400 / (spread + 1)), offsetX = 0, offsetY = 0, alpha = 1, hover = -1;
+
+function tick() {
+  const grid = new Map();
+  for (let i = 0; i < n; i++) {
+    const key = (Math.floor(x[i] / CELL) + 32768) * 65536 + Math.floor(y[i] / CELL) + 32768;
+    const bucket = grid.get(key);
+    if (bucket) bucket.push(i); else grid.set(key, [i]);
+  }
+  for (const [key, bucket] of grid) {
+    for (let dx = -1; dx <= 1; dx++) for (let dy = -1; dy <= 1; dy++) {
+      const other = grid.get(key + dx * 65536 + dy);
+      if (!other) continue;
+      for (const i of bucket) for (const j of other) {
+        if (j <= i) continue;
+        const ddx = x[i] - x[j], ddy = y[i] - y[j], d2 = ddx * ddx + ddy * ddy || 0.01;
+        if (d2 > CELL * CELL) continue;
+        const f = K * K / d2 * alpha;
+        vx[i] += ddx * f; vy[i] += ddy * f; vx[j] -= ddx * f; vy[j] -= ddy * f;
+      }
+    }
+  }
+  for (let e = 0; e < edges.length; e += 2) {
+    const i = edges[e], j = edges[e + 1], ddx = x[j] - x[i], ddy = y[j] - y[i];
+    const d = Math.sqrt(ddx * ddx + ddy * ddy) || 0.01, f = (d - K) / d * 0.05 * alpha;
+    vx[i] += ddx * f; vy[i] += ddy * f; vx[j] -= ddx * f; vy[j] -= ddy * f;
+  }
+  for (let i = 0; i < n; i++) {
+    vx[i] = (vx[i] - x[i] * 0.002 * alpha) * 0.6;
+    vy[i] = (vy[i] - y[i] * 0.002 * alpha) * 0.6;
+    x[i] += Math.max(-K, Math.min(K, vx[i]));
+    y[i] += Math.max(-K, Math.min(K, vy[i]));
+  }
+  alpha *= 0.99;
+}
+
+function draw() {
+  canvas.width = innerWidth; canvas.height = innerHeight;
+  ctx.setTransform(scale, 0, 0, scale, canvas.width / 2 + offsetX, canvas.height / 2 + offsetY);
+  ctx.strokeStyle = "#9995"; ctx.lineWidth = 1 / scale;
+  ctx.beginPath();
+  for (let e = 0; e < edges.length; e += 2) {
+    ctx.moveTo(x[edges[e]], y[edges[e]]);
+    ctx.lineTo(x[edges[e + 1]], y[edges[e + 1]]);
+  }
+  ctx.stroke();
+  const radius = Math.max(2, 3 / scale), labels = n < 500 || scale > 1.5;
+  ctx.font = `${12 / scale}px sans-serif`;
+  for (let i = 0; i < n; i++) {
+    const attributes = nodes[i].attributes;
+    ctx.fillStyle = i === hover ? "#d62728" : attributes && attributes.fillcolor || (i ? "#4a90d9" : "#f46d43");
+    ctx.fillRect(x[i] - radius, y[i] - radius, 2 * radius, 2 * radius);
+    if (labels) { ctx.fillStyle = "#333"; ctx.fillText(nodes[i].name, x[i] + radius + 1, y[i]); }
+  }
+}
+
+function frame() {
+  tick();
+  draw();
+  if (alpha > 0.005) requestAnimationFrame(frame);
+}
+
+let drag = null;
+canvas.addEventListener("mousedown", event => { drag = [event.clientX - offsetX, event.clientY - offsetY]; });
+addEventListener("mouseup", () => { drag = null; });
+canvas.addEventListener("mousemove", event => {
+  if (drag) { offsetX = event.clientX - drag[0]; offsetY = event.clientY - drag[1]; draw(); return; }
+  const px = (event.clientX - canvas.width / 2 - offsetX) / scale, py = (event.clientY - canvas.height / 2 - offsetY) / scale;
+  let best = -1, bestDistance = (8 / scale) ** 2;
+  for (let i = 0; i < n; i++) {
+    const d = (x[i] - px) ** 2 + (y[i] - py) ** 2;
+    if (d < bestDistance) { best = i; bestDistance = d; }
+  }
+  if (best !== hover) {
+    hover = best;
+    info.textContent = best < 0 ? document.title : `${nodes[best].name}: ${nodes[best].deps.map(j => nodes[j].name).join(", ")}`;
+    draw();
+  }
+});
+canvas.addEventListener("wheel", event => {
+  event.preventDefault();
+  const factor = Math.exp(-event.deltaY * 0.001);
+  const cx = event.clientX - canvas.width / 2, cy = event.clientY - canvas.height / 2;
+  offsetX = cx - (cx - offsetX) * factor; offsetY = cy - (cy - offsetY) * factor;
+  scale *= factor;
+  draw();
+}, { passive: false });
+addEventListener("resize", draw);
+frame();
+</script>
+</body>
+</html>"""
+
+
 def read_config(config_path):
     """Читает конфигурационный файл и возвращает параметры."""
     if not os.path.exists(config_path):
@@ -19,59 +187,1049 @@ def read_config(config_path):
             "package_path": config["Paths"]["package_path"],
             "output_path": config["Paths"]["output_path"],
             "repository_url": config["Paths"]["repository_url"],
+            "cache_dir": config["Paths"].get("cache_dir", DEFAULT_CACHE_DIR),
+            "render": {
+                "formats": config.get("Render", "formats", fallback="png").replace(",", " ").split(),
+                "subgraphs": config.get("Render", "subgraphs", fallback="").replace(",", " ").split(),
+                "workers": config.getint("Render", "workers", fallback=RENDER_WORKERS),
+                "timeout": config.getfloat("Render", "timeout", fallback=RENDER_TIMEOUT),
+                "sfdp_threshold": config.getint("Render", "sfdp_threshold", fallback=SFDP_THRESHOLD),
+                "pipe": config.getboolean("Render", "pipe", fallback=False),
+                "color_by_depth": config.getboolean("Render", "color_by_depth", fallback=False),
+            },
+            "reduce": {
+                "depth": config.getint("Reduce", "depth", fallback=None),
+                "pattern": config.get("Reduce", "pattern", fallback=None),
+                "collapse": config.getboolean("Reduce", "collapse_cycles", fallback=False),
+                "transitive": config.getboolean("Reduce", "transitive_reduction", fallback=False),
+            },
         }
     except KeyError as e:
         raise ValueError(f"Отсутствует обязательный параметр в конфигурации: {e}")
 
 
-def parse_dependencies(package_path, repository_url):
+def open_repository_index(repository_url):
+    """
+    Открывает APKINDEX.tar.gz репозитория как бинарный поток.
+    Поддерживаются file://-зеркала, локальные пути и HTTP(S).
+    """
+    parsed = urllib.parse.urlparse(repository_url)
+    if parsed.scheme in ("http", "https"):
+        url = repository_url
+        if not url.endswith(".tar.gz"):
+            url = url.rstrip("/") + "/" + INDEX_NAME
+        return urllib.request.urlopen(url)
+    path = urllib.request.url2pathname(parsed.path) if parsed.scheme == "file" else repository_url
+    if os.path.isdir(path):
+        path = os.path.join(path, INDEX_NAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Индекс репозитория {path} не найден.")
+    return open(path, "rb")
+
+
+def iter_archive_text(stream, member_name):
+    """
+    Читает файл member_name из tar.gz-потока блоками целых строк
+    (последний перевод строки блока отбрасывается).
+    APK и APKINDEX состоят из нескольких склеенных gzip-сегментов, поэтому поток
+    распаковывается через GzipFile; чтение останавливается сразу после нужного файла.
+    """
+    with gzip.GzipFile(fileobj=stream) as gz, tarfile.open(fileobj=gz, mode="r|") as tar:
+        for member in tar:
+            if member.isfile() and member.name.removeprefix("./") == member_name:
+                f = tar.extractfile(member)
+                decoder = codecs.getincrementaldecoder("utf-8")()
+                tail = ""
+                while chunk := f.read(READ_CHUNK_SIZE):
+                    text = tail + decoder.decode(chunk)
+                    end = text.rfind("\n") + 1
+                    tail = text[end:]
+                    if end:
+                        yield text[:end - 1]
+                tail += decoder.decode(b"", final=True)
+                if tail:
+                    yield tail
+                return
+    raise ValueError(f"В архиве отсутствует файл {member_name}.")
+
+
+def split_apkindex_records(blocks):
+    """
+    Режет текст APKINDEX на записи по пустым строкам ("\n\n") и выдаёт их списками, по одному
+    на блок. Незавершённая последняя запись блока переносится в следующий.
+    """
+    tail = ""
+    for block in blocks:
+        text = tail + "\n" + block
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        records = text.split("\n\n")
+        tail = records.pop()
+        yield records
+    yield [tail]
+
+
+def iter_apkindex_records(blocks):
     """
-    Эмулирует анализ APK-пакета для получения зависимостей.
-    Здесь используется статическая структура для демонстрации.
+    Выдаёт записи APKINDEX по одной в виде (имя, версия, зависимости, provides),
+    где зависимости и provides — исходные строки полей D: и p:.
+    Нужные поля находятся в записи поиском "\nP:", "\nV:" и т.д., остальные строки не разбираются.
+    """
+    for record in itertools.chain.from_iterable(split_apkindex_records(blocks)):
+        record = "\n" + record
+        name = record.partition("\nP:")[2].partition("\n")[0].strip()
+        if name:
+            yield (
+                name,
+                record.partition("\nV:")[2].partition("\n")[0].strip() or None,
+                record.partition("\nD:")[2].partition("\n")[0],
+                record.partition("\np:")[2].partition("\n")[0],
+            )
+
+
+def dependency_names(field):
+    """Возвращает имена из поля зависимостей без ограничений версий и конфликтов (!name)."""
+    return CONSTRAINT_RE.sub("", field).split()
+
+
+def load_repository_index(repository_url):
+    """
+    Загружает индекс репозитория в компактное отображение имя -> кортеж зависимостей.
+    Возвращает (зависимости, canonical), где canonical отображает имена пакетов
+    и виртуальные имена (so:, cmd:, pc:) на предоставляющие их пакеты.
+    """
+    with open_repository_index(repository_url) as stream:
+        return read_repository_index(stream)
+
+
+def read_repository_index(stream):
+    """
+    Разбирает APKINDEX.tar.gz из потока (см. load_repository_index).
+    Индекс читается по одной записи, его полный текст в памяти не хранится.
+    """
+    raw = {}
+    providers = {}
+    for name, _, depends, provides in iter_apkindex_records(iter_archive_text(stream, "APKINDEX")):
+        raw[name] = CONSTRAINT_RE.sub("", depends)
+        for virtual in dependency_names(provides):
+            providers.setdefault(virtual, name)
+    return resolve_index(raw, providers)
+
+
+def resolve_index(raw, providers):
+    """
+    Разрешает зависимости (строки имён без ограничений версий) в кортежи имён пакетов.
+    Виртуальные имена разрешаются только после чтения всего индекса; реальные пакеты
+    имеют приоритет, и все кортежи ссылаются на одни и те же строки-ключи.
+    """
+    canonical = dict(providers)
+    canonical.update(zip(raw, raw))
+    dependencies = {}
+    for name, depends in raw.items():
+        names = depends.split()
+        resolved = dict.fromkeys(map(canonical.get, names, names))
+        resolved.pop(name, None)
+        dependencies[name] = tuple(resolved)
+    return dependencies, canonical
+
+
+def read_repository_records(stream):
+    """Читает записи APKINDEX как есть: имя -> (версия, поле D:, поле p:)."""
+    return {
+        name: (version, depends, provides)
+        for name, version, depends, provides in iter_apkindex_records(iter_archive_text(stream, "APKINDEX"))
+    }
+
+
+@functools.lru_cache(maxsize=65536)
+def version_key(version):
+    """Ключ сравнения версий apk: числа, буква, суффиксы (_rc1 < релиз < _p1) и номер сборки -rN."""
+    match = VERSION_RE.match(version or "")
+    if match is None:
+        return tuple(int(number) for number in re.findall(r"\d+", version or "")), "", (), 0
+    numbers, letter, suffixes, release = match.groups()
+    suffixes = tuple(
+        (VERSION_SUFFIXES.get(suffix, 0), int(number or 0))
+        for suffix, number in re.findall(r"_([a-z]+)(\d*)", suffixes)
+    )
+    return tuple(map(int, numbers.split("."))), letter, suffixes + ((0, 0),), int(release or 0)
+
+
+def version_satisfies(version, operator, required):
+    """Проверяет ограничение версии apk (<, <=, =, >=, >, ~ — совпадение по префиксу)."""
+    if operator == "~":
+        return version == required or version.startswith(required + ".") or version.startswith(required + "-")
+    key, required_key = version_key(version), version_key(required)
+    return {
+        "<": key < required_key,
+        "<=": key <= required_key,
+        "=": key == required_key,
+        ">=": key >= required_key,
+        ">": key > required_key,
+    }.get(operator, True)
+
+
+def merge_repositories(repositories):
+    """
+    Объединяет записи нескольких репозиториев, заданных в порядке убывания приоритета.
+    Пакет берётся из самого приоритетного репозитория; если его версия нарушает
+    ограничения, наложенные выбранными пакетами (name>=1.2 и т.п.), берётся
+    следующий по приоритету кандидат, удовлетворяющий всем ограничениям.
+    Возвращает (зависимости, canonical), как read_repository_index.
+    """
+    candidates = {}
+    for priority, records in enumerate(repositories):
+        for name, record in records.items():
+            candidates.setdefault(name, []).append((priority, record))
+    chosen = {name: options[0] for name, options in candidates.items()}
+
+    # Выбор есть только у пакетов, найденных в нескольких репозиториях
+    alternatives = {name for name, options in candidates.items() if len(options) > 1}
+    constraints = {}
+    for _, (_, depends, _) in chosen.values():
+        for name, operator, version in CONSTRAINED_RE.findall(depends):
+            if name in alternatives:
+                constraints.setdefault(name, set()).add((operator, version))
+    for name, required in constraints.items():
+        options = candidates[name]
+        satisfying = next((
+            option for option in options
+            if all(version_satisfies(option[1][0], operator, version) for operator, version in required)
+        ), None)
+        if satisfying is not None:
+            chosen[name] = satisfying
+        else:
+            print(f"Предупреждение: ни одна версия {name} не удовлетворяет ограничениям "
+                  f"{', '.join(operator + version for operator, version in required)}")
+
+    raw = {}
+    providers = {}
+    # Виртуальные имена достаются пакетам из более приоритетных репозиториев
+    for name, (_, (_, depends, provides)) in sorted(chosen.items(), key=lambda item: item[1][0]):
+        raw[name] = CONSTRAINT_RE.sub("", depends)
+        for virtual in dependency_names(provides):
+            providers.setdefault(virtual, name)
+    return resolve_index(raw, providers)
+
+
+def read_pkginfo(package_path):
+    """Читает имя пакета и его зависимости из .PKGINFO внутри APK-файла."""
+    name, depends = None, []
+    with open(package_path, "rb") as f:
+        text = "\n".join(iter_archive_text(f, ".PKGINFO"))
+        for line in text.splitlines():
+            key, _, value = line.partition(" = ")
+            if key == "pkgname":
+                name = value.strip()
+            elif key == "depend":
+                depends.append(value.strip())
+    if name is None:
+        raise ValueError(f"В {package_path} не указано имя пакета (pkgname).")
+    return name, depends
+
+
+def parse_dependencies(package_path, repository_url, cache_dir=None):
+    """
+    Анализирует APK-пакет и индекс репозитория и возвращает граф зависимостей,
+    достижимых из пакета: имя -> список зависимостей.
+    Зависимости, отсутствующие в индексе, попадают в граф как листья.
+    Если указан cache_dir, разобранный индекс берётся из кэша (см. load_repository_graph).
     """
     if not os.path.exists(package_path):
         raise FileNotFoundError(f"APK-файл {package_path} не найден.")
-    
-    # Заглушка: фиксированные зависимости для демонстрации.
+
+    root, depends = read_pkginfo(package_path)
+    if repository_url:
+        graph = load_repository_graph(repository_url, cache_dir)
+    else:
+        graph = DependencyGraph.from_dependencies({})
+    names, ids = graph.names, graph.ids
+
+    root_deps = (names[ids[dep]] if dep in ids else dep for dep in dependency_names(" ".join(depends)))
+    result = {root: list(dict.fromkeys(root_deps))}
+    queue = list(result[root])
+    while queue:
+        package = queue.pop()
+        if package in result:
+            continue
+        node = ids.get(package)
+        result[package] = deps = list(map(names.__getitem__, graph.successors(node))) if node is not None else []
+        # Уже обойдённые пакеты пропускаются при извлечении из очереди
+        queue.extend(deps)
+    return result
+
+
+class DependencyGraph:
+    """
+    Граф зависимостей с целочисленными идентификаторами пакетов.
+    Рёбра хранятся в формате CSR: зависимости пакета i — это
+    targets[offsets[i]:offsets[i + 1]]. Массивы могут быть как array, так и
+    memoryview поверх отображённого в память кэша. aliases отображает
+    виртуальные имена (so:, cmd:) на идентификаторы пакетов. Обратный индекс
+    (кто зависит от пакета) хранится в том же формате и строится по требованию.
+    """
+
+    def __init__(self, names, offsets, targets, aliases=None, reverse_offsets=None, reverse_targets=None):
+        self.names = names
+        self.ids = dict(zip(names, range(len(names))))
+        self.aliases = aliases or {}
+        for alias, node in self.aliases.items():
+            self.ids.setdefault(alias, node)
+        self.offsets = offsets
+        self.targets = targets
+        self.reverse_offsets = reverse_offsets
+        self.reverse_targets = reverse_targets
+        self._components = None
+        self._starts = None
+        self._order = None
+        self._closures = {}
+
+    @classmethod
+    def from_dependencies(cls, dependencies, aliases=None):
+        """
+        Строит граф из отображения имя -> зависимости; неизвестные зависимости становятся листьями.
+        aliases — необязательное отображение виртуальное имя -> имя пакета.
+        """
+        names = list(dependencies)
+        ids = {name: i for i, name in enumerate(names)}
+        offsets = array("I", [0])
+        targets = array("I")
+        for deps in dependencies.values():
+            for dep in deps:
+                target = ids.get(dep)
+                if target is None:
+                    target = ids[dep] = len(names)
+                    names.append(dep)
+                targets.append(target)
+            offsets.append(len(targets))
+        offsets.extend([len(targets)] * (len(names) - len(dependencies)))
+        aliases = {alias: ids[name] for alias, name in (aliases or {}).items() if name in ids and alias not in ids}
+        return cls(names, offsets, targets, aliases)
+
+    def __len__(self):
+        return len(self.names)
+
+    def successors(self, node):
+        """Возвращает идентификаторы прямых зависимостей пакета."""
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def reverse_index(self):
+        """
+        Возвращает обратный индекс (reverse_offsets, reverse_targets): пакеты, зависящие
+        от i, — это reverse_targets[reverse_offsets[i]:reverse_offsets[i + 1]].
+        Строится один раз сортировкой подсчётом за O(V + E).
+        """
+        if self.reverse_offsets is None:
+            offsets, targets = self.offsets, self.targets
+            count = len(self.names)
+            reverse_offsets = array("I", [0]) * (count + 1)
+            for target in targets:
+                reverse_offsets[target + 1] += 1
+            for node in range(count):
+                reverse_offsets[node + 1] += reverse_offsets[node]
+            positions = reverse_offsets[:-1]
+            reverse_targets = array("I", [0]) * len(targets)
+            for source in range(count):
+                for target in targets[offsets[source]:offsets[source + 1]]:
+                    reverse_targets[positions[target]] = source
+                    positions[target] += 1
+            self.reverse_offsets, self.reverse_targets = reverse_offsets, reverse_targets
+        return self.reverse_offsets, self.reverse_targets
+
+    def predecessors(self, node):
+        """Возвращает идентификаторы пакетов, напрямую зависящих от пакета."""
+        reverse_offsets, reverse_targets = self.reverse_index()
+        return reverse_targets[reverse_offsets[node]:reverse_offsets[node + 1]]
+
+    def node_id(self, name):
+        """Возвращает идентификатор пакета (или виртуального имени) либо сообщает об ошибке."""
+        node = self.ids.get(name)
+        if node is None:
+            raise ValueError(f"Пакет {name} не найден в графе зависимостей.")
+        return node
+
+    def reverse_closure(self, name):
+        """
+        Возвращает пакеты, транзитивно зависящие от указанного, в порядке удалённости.
+        Обходится только затронутая часть графа.
+        """
+        start = self.node_id(name)
+        seen = {start}
+        result = []
+        frontier = [start]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for parent in self.predecessors(node):
+                    if parent not in seen:
+                        seen.add(parent)
+                        next_frontier.append(parent)
+                    elif parent == start and start not in result:
+                        result.append(start)
+            result.extend(next_frontier)
+            frontier = next_frontier
+        return [self.names[node] for node in result]
+
+    def shortest_path(self, source, target):
+        """Возвращает кратчайшую цепочку зависимостей от source к target или None."""
+        start, goal = self.node_id(source), self.node_id(target)
+        parents = {start: None}
+        frontier = [start]
+        while frontier and goal not in parents:
+            next_frontier = []
+            for node in frontier:
+                for child in self.successors(node):
+                    if child not in parents:
+                        parents[child] = node
+                        next_frontier.append(child)
+            frontier = next_frontier
+        if goal not in parents:
+            return None
+        path = []
+        node = goal
+        while node is not None:
+            path.append(self.names[node])
+            node = parents[node]
+        return path[::-1]
+
+    def subgraph(self, name, depth):
+        """
+        Извлекает подграф зависимостей пакета глубиной не более depth рёбер
+        в виде отображения имя -> список зависимостей внутри подграфа.
+        """
+        start = self.node_id(name)
+        depths = {start: 0}
+        frontier = [start]
+        for level in range(1, depth + 1):
+            next_frontier = []
+            for node in frontier:
+                for child in self.successors(node):
+                    if child not in depths:
+                        depths[child] = level
+                        next_frontier.append(child)
+            frontier = next_frontier
+        names = self.names
+        return {
+            names[node]: [names[child] for child in self.successors(node) if child in depths]
+            for node in depths
+        }
+
+    def strongly_connected_components(self):
+        """
+        Находит компоненты сильной связности алгоритмом Тарьяна (без рекурсии).
+        Компоненты нумеруются в порядке обнаружения: зависимости компоненты всегда
+        имеют меньшие номера. Возвращает (номер компоненты для каждого пакета,
+        список компонент); результат запоминается.
+        """
+        if self._components is not None:
+            return self._components
+        offsets, targets = self.offsets, self.targets
+        count = len(self.names)
+        index = array("i", [-1]) * count
+        low = array("i", [0]) * count
+        on_stack = bytearray(count)
+        component = array("i", [-1]) * count
+        components = []
+        stack = []
+        counter = 0
+        for root in range(count):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, offsets[root])]
+            while work:
+                node, edge = work[-1]
+                end = offsets[node + 1]
+                while edge < end:
+                    target = targets[edge]
+                    edge += 1
+                    if index[target] == -1:
+                        work[-1] = (node, edge)
+                        index[target] = low[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, offsets[target]))
+                        break
+                    if on_stack[target] and index[target] < low[node]:
+                        low[node] = index[target]
+                else:
+                    work.pop()
+                    if work and low[node] < low[work[-1][0]]:
+                        low[work[-1][0]] = low[node]
+                    if low[node] == index[node]:
+                        members = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = 0
+                            component[member] = len(components)
+                            members.append(member)
+                            if member == node:
+                                break
+                        components.append(members)
+        self._components = component, components
+        return self._components
+
+    def cycles(self):
+        """Возвращает циклические зависимости: списки имён пакетов каждой нетривиальной компоненты."""
+        _, components = self.strongly_connected_components()
+        return [
+            sorted(self.names[member] for member in members)
+            for members in components
+            if len(members) > 1 or members[0] in self.successors(members[0])
+        ]
+
+    def _layout(self):
+        """Нумерует пакеты подряд в порядке компонент: позиция -> пакет и начало каждой компоненты."""
+        if self._starts is None:
+            _, components = self.strongly_connected_components()
+            starts, order = array("I"), array("I")
+            for members in components:
+                starts.append(len(order))
+                order.extend(members)
+            self._starts, self._order = starts, order
+        return self._starts, self._order
+
+    def _closure_bits(self, cid):
+        """
+        Возвращает замыкание компоненты как битовую маску по позициям пакетов
+        (пакеты пронумерованы подряд в порядке компонент). Замыкания запоминаются,
+        поэтому общие поддеревья вычисляются один раз.
+        """
+        component, components = self.strongly_connected_components()
+        closures = self._closures
+        if cid in closures:
+            return closures[cid]
+        starts, _ = self._layout()
+        work = [cid]
+        while work:
+            current = work[-1]
+            if current in closures:
+                work.pop()
+                continue
+            members = components[current]
+            children = {component[target] for member in members for target in self.successors(member)}
+            pending = [child for child in children if child != current and child not in closures]
+            if pending:
+                work.extend(pending)
+                continue
+            bits = 0
+            for child in children:
+                size = len(components[child])
+                bits |= ((1 << size) - 1) << starts[child]
+                if child != current:
+                    bits |= closures[child]
+            closures[current] = bits
+            work.pop()
+        return closures[cid]
+
+    def closure(self, name):
+        """
+        Возвращает транзитивное замыкание зависимостей пакета (список имён).
+        Сам пакет входит в замыкание, только если он лежит на цикле.
+        """
+        component, _ = self.strongly_connected_components()
+        bits = self._closure_bits(component[self.ids[name]])
+        _, order = self._layout()
+        digits = bin(bits)[:1:-1]
+        return [self.names[order[position]] for position, digit in enumerate(digits) if digit == "1"]
+
+    def resolve_all(self):
+        """
+        Вычисляет замыкания всех пакетов и возвращает отображение имя -> число
+        транзитивных зависимостей. Компоненты обходятся в порядке номеров, поэтому
+        замыкания зависимостей всегда уже готовы.
+        """
+        _, components = self.strongly_connected_components()
+        sizes = {}
+        for cid, members in enumerate(components):
+            size = self._closure_bits(cid).bit_count()
+            for member in members:
+                sizes[self.names[member]] = size
+        return sizes
+
+
+def file_checksum(stream):
+    """Вычисляет SHA-256 содержимого потока, не загружая его в память целиком."""
+    digest = hashlib.sha256()
+    while chunk := stream.read(READ_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.digest()
+
+
+def save_graph_cache(graph, cache_path, checksum):
+    """Атомарно записывает граф в компактный бинарный кэш."""
+    names = "\n".join(graph.names).encode("utf-8")
+    alias_names = "\n".join(graph.aliases).encode("utf-8")
+    alias_ids = array("I", graph.aliases.values())
+    reverse_offsets, reverse_targets = graph.reverse_index()
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CACHE_HEADER.pack(CACHE_MAGIC, checksum, len(graph.names), len(graph.targets),
+                                  len(alias_ids), len(names), len(alias_names)))
+        f.write(graph.offsets)
+        f.write(graph.targets)
+        f.write(reverse_offsets)
+        f.write(reverse_targets)
+        f.write(alias_ids)
+        f.write(names)
+        f.write(alias_names)
+    os.replace(tmp_path, cache_path)
+
+
+def load_graph_cache(cache_path, checksum):
+    """
+    Отображает кэш графа в память. Массивы рёбер используются без копирования;
+    при несовпадении контрольной суммы индекса или повреждённом файле возвращает None.
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(buffer) < CACHE_HEADER.size:
+        return None
+    magic, cached_checksum, node_count, edge_count, alias_count, names_size, aliases_size = \
+        CACHE_HEADER.unpack_from(buffer)
+    arrays_size = 4 * (2 * (node_count + 1 + edge_count) + alias_count)
+    if (magic != CACHE_MAGIC or cached_checksum != checksum
+            or len(buffer) != CACHE_HEADER.size + arrays_size + names_size + aliases_size):
+        return None
+
+    view = memoryview(buffer)
+    arrays = []
+    position = CACHE_HEADER.size
+    for size in (node_count + 1, edge_count, node_count + 1, edge_count, alias_count):
+        arrays.append(view[position:position + 4 * size].cast("I"))
+        position += 4 * size
+    offsets, targets, reverse_offsets, reverse_targets, alias_ids = arrays
+    names = bytes(view[position:position + names_size]).decode("utf-8").split("\n") if node_count else []
+    position += names_size
+    alias_names = bytes(view[position:position + aliases_size]).decode("utf-8").split("\n") if alias_count else []
+    return DependencyGraph(names, offsets, targets, dict(zip(alias_names, alias_ids)),
+                           reverse_offsets, reverse_targets)
+
+
+def split_repositories(repository_url):
+    """Разбивает список репозиториев (через запятую или пробел) в порядке убывания приоритета."""
+    if isinstance(repository_url, str):
+        return repository_url.replace(",", " ").split()
+    return list(repository_url)
+
+
+def fetch_repository_index(repository_url):
+    """
+    Открывает индекс репозитория как файл с произвольным доступом и считает его SHA-256.
+    Ответ HTTP сохраняется во временный файл. Возвращает (поток, контрольная сумма).
+    """
+    stream = open_repository_index(repository_url)
+    if not stream.seekable():
+        with stream:
+            spool = tempfile.TemporaryFile()
+            shutil.copyfileobj(stream, spool, READ_CHUNK_SIZE)
+        stream = spool
+    stream.seek(0)
+    checksum = file_checksum(stream)
+    stream.seek(0)
+    return stream, checksum
+
+
+def timed(function, *args):
+    """Вызывает функцию и возвращает (результат, время выполнения в секундах)."""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def load_repository_graph(repository_url, cache_dir=None, timings=None):
+    """
+    Загружает граф зависимостей одного или нескольких репозиториев (см. split_repositories).
+    Индексы загружаются и разбираются параллельно, несколько репозиториев объединяются
+    merge_repositories. Если указан cache_dir, разобранный граф хранится там в бинарном
+    виде, привязанном к SHA-256 файлов индексов: пока они не изменились, разбор пропускается.
+    Время загрузки и разбора каждого репозитория выводится и добавляется в список timings.
+    """
+    repositories = split_repositories(repository_url)
+    if not repositories:
+        raise ValueError("Не указан ни один репозиторий.")
+    # Пул закрывается раньше ExitStack, поэтому к закрытию потоков все загрузки уже завершены
+    with contextlib.ExitStack() as stack, ThreadPoolExecutor(max_workers=len(repositories)) as pool:
+        futures = [pool.submit(timed, fetch_repository_index, url) for url in repositories]
+        fetched, error = [], None
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = error or e
+                continue
+            # Уже открытые потоки закрываются, даже если загрузка другого репозитория не удалась
+            stack.callback(result[0][0].close)
+            fetched.append(result)
+        if error is not None:
+            raise error
+        streams = [stream for (stream, _), _ in fetched]
+        checksums = [checksum for (_, checksum), _ in fetched]
+        checksum = checksums[0] if len(checksums) == 1 else hashlib.sha256(b"".join(checksums)).digest()
+
+        graph = cache_path = None
+        if cache_dir:
+            url_hash = hashlib.sha256("\n".join(repositories).encode("utf-8")).hexdigest()[:16]
+            cache_path = os.path.join(cache_dir, f"{url_hash}.graph")
+            graph = load_graph_cache(cache_path, checksum)
+        parse_times = [None] * len(repositories)
+        if graph is None:
+            if len(repositories) == 1:
+                (dependencies, canonical), parse_times[0] = timed(read_repository_index, streams[0])
+            else:
+                parsed = list(pool.map(lambda stream: timed(read_repository_records, stream), streams))
+                parse_times = [parse_time for _, parse_time in parsed]
+                dependencies, canonical = merge_repositories([records for records, _ in parsed])
+            graph = DependencyGraph.from_dependencies(dependencies, canonical)
+            if cache_path:
+                save_graph_cache(graph, cache_path, checksum)
+
+    for url, (_, fetch_time), parse_time in zip(repositories, fetched, parse_times):
+        if timings is not None:
+            timings.append({"repository": url, "fetch": fetch_time, "parse": parse_time})
+        parse_report = f"разбор {parse_time * 1000:.1f} мс" if parse_time is not None else "граф взят из кэша"
+        print(f"Репозиторий {url}: загрузка {fetch_time * 1000:.1f} мс, {parse_report}")
+    return graph
+
+
+def dot_quote(name):
+    """Экранирует имя для DOT: кавычки, обратные слэши и переводы строк."""
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+
+def format_attributes(attributes):
+    """Форматирует словарь атрибутов DOT: {"color": "red"} -> ' [color="red"]'."""
+    if not attributes:
+        return ""
+    return " [" + ", ".join(f"{key}={dot_quote(str(value))}" for key, value in attributes.items()) + "]"
+
+
+def depth_attributes(dependencies, root):
+    """Возвращает атрибуты узлов, окрашивающие пакеты по глубине от корня (обход в ширину)."""
+    depths = {root: 0}
+    frontier = [root]
+    while frontier:
+        next_frontier = []
+        for package in frontier:
+            for dep in dependencies.get(package, ()):
+                if dep not in depths:
+                    depths[dep] = depths[package] + 1
+                    next_frontier.append(dep)
+        frontier = next_frontier
     return {
-        "package": ["libA", "libB"],
-        "libA": ["libC"],
-        "libB": ["libD", "libE"],
-        "libC": [],
-        "libD": ["libF"],
-        "libE": [],
-        "libF": [],
+        name: {"style": "filled", "fillcolor": DEPTH_COLORS[min(depth, len(DEPTH_COLORS) - 1)]}
+        for name, depth in depths.items()
     }
 
 
-def generate_dot(dependencies):
+def iter_graph(dependencies, node_attributes=None, edge_attributes=None):
+    """
+    Общий обход графа для всех форматов вывода (DOT, JSON, GraphML, HTML).
+    Узлы нумеруются в порядке первого появления: сначала ключи словаря, затем
+    зависимости-листья. Для каждого узла выдаётся кортеж
+    (номер, имя, атрибуты узла, [(номер зависимости, имя зависимости, атрибуты ребра), ...]).
+    """
+    node_attributes = node_attributes or {}
+    edge_attributes = edge_attributes or {}
+    ids = {}
+    for name in itertools.chain(dependencies, itertools.chain.from_iterable(dependencies.values())):
+        ids.setdefault(name, len(ids))
+    for name, node in ids.items():
+        edges = [(ids[dep], dep, edge_attributes.get((name, dep))) for dep in dependencies.get(name, ())]
+        yield node, name, node_attributes.get(name), edges
+
+
+def iter_dot(dependencies, node_attributes=None, edge_attributes=None):
+    """
+    Построчно выдаёт граф зависимостей в формате DOT, не собирая его в одну строку.
+    node_attributes отображает имя пакета, а edge_attributes — пару (пакет, зависимость)
+    на словарь атрибутов DOT.
+    """
+    yield "digraph Dependencies {"
+    for _, name, attributes, edges in iter_graph(dependencies, node_attributes, edge_attributes):
+        source = dot_quote(name)
+        if attributes:
+            yield f"    {source}{format_attributes(attributes)};"
+        for _, dep, edge in edges:
+            yield f"    {source} -> {dot_quote(dep)}{format_attributes(edge)};"
+    yield "}"
+
+
+def iter_json(dependencies, node_attributes=None, edge_attributes=None):
+    """
+    Построчно выдаёт граф в компактном JSON со списками смежности, по узлу на строку:
+    {"directed":true,"nodes":[{"name":"a","deps":[1,2]},...]}. Зависимости задаются
+    номерами узлов; атрибуты узла и рёбер добавляются, только если они заданы.
+    """
+    yield '{"directed":true,"nodes":['
+    for node, name, attributes, edges in iter_graph(dependencies, node_attributes, edge_attributes):
+        record = {"name": name, "deps": [target for target, _, _ in edges]}
+        if attributes:
+            record["attributes"] = attributes
+        edge_records = [[target, edge] for target, _, edge in edges if edge]
+        if edge_records:
+            record["edge_attributes"] = edge_records
+        yield ("," if node else "") + json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    yield "]}"
+
+
+def iter_graphml(dependencies, node_attributes=None, edge_attributes=None):
+    """Построчно выдаёт граф в формате GraphML; атрибуты узлов и рёбер становятся ключами <data>."""
+    node_keys = {key: f"v{i}" for i, key in enumerate(
+        dict.fromkeys(key for attributes in (node_attributes or {}).values() for key in attributes))}
+    edge_keys = {key: f"e{i}" for i, key in enumerate(
+        dict.fromkeys(key for attributes in (edge_attributes or {}).values() for key in attributes))}
+    yield '<?xml version="1.0" encoding="UTF-8"?>'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">'
+    yield '  <key id="name" for="node" attr.name="name" attr.type="string"/>'
+    for keys, kind in ((node_keys, "node"), (edge_keys, "edge")):
+        for key, key_id in keys.items():
+            yield f'  <key id="{key_id}" for="{kind}" attr.name={quoteattr(key)} attr.type="string"/>'
+    yield '  <graph id="Dependencies" edgedefault="directed">'
+    for node, name, attributes, edges in iter_graph(dependencies, node_attributes, edge_attributes):
+        data = "".join(f'<data key="{node_keys[key]}">{escape(str(value))}</data>'
+                       for key, value in (attributes or {}).items())
+        yield f'    <node id="n{node}"><data key="name">{escape(name)}</data>{data}</node>'
+        for target, _, edge in edges:
+            if edge:
+                data = "".join(f'<data key="{edge_keys[key]}">{escape(str(value))}</data>'
+                               for key, value in edge.items())
+                yield f'    <edge source="n{node}" target="n{target}">{data}</edge>'
+            else:
+                yield f'    <edge source="n{node}" target="n{target}"/>'
+    yield "  </graph>"
+    yield "</graphml>"
+
+
+def iter_html(dependencies, node_attributes=None, edge_attributes=None):
+    """
+    Построчно выдаёт самодостаточную HTML-страницу: граф встраивается в неё в формате
+    iter_json, а раскладка (силовой алгоритм) выполняется в браузере, без Graphviz.
+    """
+    title = html.escape(next(iter(dependencies), "Dependencies"))
+    head, tail = HTML_TEMPLATE.split("/*GRAPH*/")
+    yield head.replace("{title}", title)
+    for line in iter_json(dependencies, node_attributes, edge_attributes):
+        # "</" внутри строки JSON закрыл бы тег <script>
+        yield line.replace("</", "<\\/")
+    yield tail
+
+
+def write_dot(lines, f):
+    """Пишет строки DOT (или другого формата вывода) в файл или канал по мере их генерации."""
+    for line in lines:
+        f.write(line)
+        f.write("\n")
+
+
+# Форматы, которые записываются напрямую, без раскладки в Graphviz
+EXPORT_FORMATS = {"json": iter_json, "graphml": iter_graphml, "html": iter_html}
+
+
+def split_formats(formats):
+    """Разделяет форматы вывода на экспортируемые напрямую и рендеримые Graphviz."""
+    return ([fmt for fmt in formats if fmt in EXPORT_FORMATS],
+            [fmt for fmt in formats if fmt not in EXPORT_FORMATS])
+
+
+def save_export(dependencies, output_path, fmt, node_attributes=None):
+    """Сохраняет граф в формате json, graphml или html рядом с output_path и возвращает путь."""
+    target = Path(output_path).with_suffix("." + fmt)
+    with open(target, "w", encoding="utf-8") as f:
+        write_dot(EXPORT_FORMATS[fmt](dependencies, node_attributes), f)
+    print(f"Граф сохранён ({fmt}): {target}")
+    return target
+
+
+def filter_dependencies(dependencies, pattern, root=None):
+    """
+    Оставляет пакеты, имена которых соответствуют шаблону (fnmatch), и рёбра между ними.
+    Корневой пакет сохраняется всегда.
+    """
+    keep = {name for name in DependencyGraph.from_dependencies(dependencies).names
+            if name == root or fnmatch.fnmatchcase(name, pattern)}
+    return {name: [dep for dep in deps if dep in keep] for name, deps in dependencies.items() if name in keep}
+
+
+def collapse_cycles(dependencies):
+    """
+    Заменяет каждую циклическую компоненту одним узлом с именем вида "libA, libB".
+    Порядок пакетов сохраняется: компонента получает место своего первого пакета.
+    """
+    graph = DependencyGraph.from_dependencies(dependencies)
+    component, components = graph.strongly_connected_components()
+    labels = [
+        ", ".join(sorted(graph.names[member] for member in members)) if len(members) > 1 else graph.names[members[0]]
+        for members in components
+    ]
+    result = {}
+    for name, deps in dependencies.items():
+        label = labels[component[graph.ids[name]]]
+        targets = result.setdefault(label, {})
+        targets.update((labels[component[graph.ids[dep]]], None) for dep in deps)
+        targets.pop(label, None)
+    return {label: list(targets) for label, targets in result.items()}
+
+
+def transitive_reduction(dependencies):
+    """
+    Удаляет рёбра, следующие из более длинных путей: ребро u -> v лишнее, если v достижим
+    из другой прямой зависимости u. Достижимость берётся из битовых масок замыканий
+    DependencyGraph. Циклы предварительно сворачиваются (collapse_cycles).
+    """
+    graph = DependencyGraph.from_dependencies(dependencies)
+    if graph.cycles():
+        dependencies = collapse_cycles(dependencies)
+        graph = DependencyGraph.from_dependencies(dependencies)
+    component, _ = graph.strongly_connected_components()
+    starts, _ = graph._layout()
+    result = {}
+    for name in dependencies:
+        children = dict.fromkeys(graph.successors(graph.ids[name]))
+        covered = 0
+        for child in children:
+            covered |= graph._closure_bits(component[child])
+        result[name] = [graph.names[child] for child in children if not (covered >> starts[component[child]]) & 1]
+    return result
+
+
+def reduce_dependencies(dependencies, root, depth=None, pattern=None, collapse=False, transitive=False):
+    """
+    Упрощает граф перед выводом: ограничение глубины от root, фильтр имён по шаблону,
+    свёртка циклов и транзитивная редукция (в этом порядке). Корень остаётся первым ключом.
+    """
+    if depth is not None:
+        dependencies = DependencyGraph.from_dependencies(dependencies).subgraph(root, depth)
+    if pattern:
+        dependencies = filter_dependencies(dependencies, pattern, root)
+    if transitive:
+        dependencies = transitive_reduction(dependencies)
+    elif collapse:
+        dependencies = collapse_cycles(dependencies)
+    return dependencies
+
+
+def generate_dot(dependencies, node_attributes=None, edge_attributes=None):
     """Создаёт представление графа зависимостей в формате DOT."""
-    lines = ["digraph Dependencies {"]
-    for package, deps in dependencies.items():
-        for dep in deps:
-            lines.append(f'    "{package}" -> "{dep}";')
-    lines.append("}")
-    return "\n".join(lines)
+    return "\n".join(iter_dot(dependencies, node_attributes, edge_attributes))
 
 
 def save_dot_to_file(dot_content, output_path):
-    """Сохраняет содержимое DOT в файл."""
+    """Сохраняет содержимое DOT (строку или итератор строк из iter_dot) в файл."""
     dot_path = Path(output_path).with_suffix(".dot")
-    with open(dot_path, "w") as f:
-        f.write(dot_content)
+    with open(dot_path, "w", encoding="utf-8") as f:
+        if isinstance(dot_content, str):
+            f.write(dot_content)
+        else:
+            write_dot(dot_content, f)
     print(f"Файл графа (DOT) сохранён: {dot_path}")
     return dot_path
 
 
-def render_graph(dot_path, graphviz_path, output_path):
-    """Выполняет рендеринг графа с помощью Graphviz."""
-    png_path = Path(output_path).with_suffix(".png")
+def pipe_dot(lines, graphviz_path, output_path, fmt="png"):
+    """
+    Передаёт строки DOT прямо на стандартный ввод Graphviz без промежуточного файла.
+    Кэширование результата (см. render_dot) в этом режиме не выполняется.
+    """
+    target = Path(output_path).with_suffix("." + fmt)
+    try:
+        process = subprocess.Popen([graphviz_path, f"-T{fmt}", "-o", str(target)],
+                                   stdin=subprocess.PIPE, encoding="utf-8")
+    except FileNotFoundError:
+        raise RuntimeError(f"Не удалось найти Graphviz по пути: {graphviz_path}")
+    try:
+        write_dot(lines, process.stdin)
+    finally:
+        process.stdin.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, process.args)
+    print(f"Граф успешно визуализирован: {target}")
+    return target
+
+
+def count_dot_nodes(dot_path):
+    """Подсчитывает число различных узлов в DOT-файле, читая его построчно."""
+    names = set()
+    with open(dot_path, encoding="utf-8") as f:
+        for line in f:
+            match = DOT_NODE_RE.match(line)
+            if match:
+                names.update(name for name in match.groups() if name is not None)
+    return len(names)
+
+
+def render_dot(dot_path, graphviz_path, output_path, fmt="png", node_count=None,
+               timeout=RENDER_TIMEOUT, sfdp_threshold=SFDP_THRESHOLD):
+    """
+    Рендерит DOT-файл в формат fmt. Рядом с результатом сохраняется хэш DOT-файла:
+    если он совпадает, рендеринг пропускается. Графы больше sfdp_threshold узлов
+    раскладываются dot с тайм-аутом, по истечении которого используется sfdp.
+    Возвращает (путь к результату, движок или None, если результат взят из кэша).
+    """
+    target = Path(output_path).with_suffix("." + fmt)
+    stamp = target.with_name(target.name + ".sha256")
+    with open(dot_path, "rb") as f:
+        digest = file_checksum(f).hex()
+    if target.exists() and stamp.exists() and stamp.read_text() == digest:
+        return target, None
+
+    if node_count is None:
+        node_count = count_dot_nodes(dot_path)
+    command = [graphviz_path, f"-T{fmt}", str(dot_path), "-o", str(target)]
+    engine = "dot"
     try:
-        subprocess.run([graphviz_path, "-Tpng", str(dot_path), "-o", str(png_path)], check=True)
-        print(f"Граф успешно визуализирован: {png_path}")
+        if node_count > sfdp_threshold:
+            try:
+                subprocess.run(command, check=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                engine = "sfdp"
+                subprocess.run(command[:1] + ["-Ksfdp"] + command[1:], check=True)
+        else:
+            subprocess.run(command, check=True)
     except FileNotFoundError:
         raise RuntimeError(f"Не удалось найти Graphviz по пути: {graphviz_path}")
-    return png_path
+    stamp.write_text(digest)
+    return target, engine
+
+
+def render_graphs(jobs, graphviz_path, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT,
+                  sfdp_threshold=SFDP_THRESHOLD):
+    """
+    Параллельно рендерит задания (dot_path, output_path, формат, число узлов или None)
+    не более чем в workers процессах Graphviz. Возвращает результаты render_dot в порядке заданий.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(render_dot, dot_path, graphviz_path, output_path, fmt, node_count, timeout, sfdp_threshold)
+            for dot_path, output_path, fmt, node_count in jobs
+        ]
+        results = [future.result() for future in futures]
+    for target, engine in results:
+        if engine is None:
+            print(f"Граф не изменился, используется готовый файл: {target}")
+        else:
+            print(f"Граф успешно визуализирован ({engine}): {target}")
+    return results
+
+
+def render_graph(dot_path, graphviz_path, output_path):
+    """Выполняет рендеринг графа в PNG с помощью Graphviz."""
+    return render_graphs([(dot_path, output_path, "png", None)], graphviz_path)[0][0]
+
+
+def subgraph_output_path(output_path, package):
+    """Возвращает путь для подграфа пакета: graph.png -> graph_<пакет>."""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}_{re.sub(r'[^A-Za-z0-9_-]', '_', package)}")
 
 
 def main(config_path):
@@ -80,26 +1238,119 @@ def main(config_path):
     config = read_config(config_path)
     
     print("Анализ зависимостей APK-пакета...")
-    dependencies = parse_dependencies(config["package_path"], config["repository_url"])
+    dependencies = parse_dependencies(config["package_path"], config["repository_url"], config["cache_dir"])
+    
+    print("Разрешение транзитивных зависимостей...")
+    graph = DependencyGraph.from_dependencies(dependencies)
+    root = next(iter(dependencies))
+    print(f"Транзитивных зависимостей пакета {root}: {len(graph.closure(root))}")
+    for cycle in graph.cycles():
+        print(f"Обнаружена циклическая зависимость: {', '.join(cycle)}")
     
-    print("Генерация графа зависимостей (DOT)...")
-    dot_content = generate_dot(dependencies)
+    render = config["render"]
+    exports, formats = split_formats(render["formats"])
+    outputs = [(config["output_path"], root, dependencies)]
+    for package in render["subgraphs"]:
+        if package not in graph.ids:
+            raise ValueError(f"Пакет {package} не найден в графе зависимостей.")
+        subgraph = {name: dependencies[name] for name in dict.fromkeys([package] + graph.closure(package))}
+        outputs.append((subgraph_output_path(config["output_path"], package), package, subgraph))
     
-    print("Сохранение графа в файл...")
-    dot_path = save_dot_to_file(dot_content, config["output_path"])
+    if any(config["reduce"].values()):
+        print("Упрощение графа зависимостей...")
+    reduced = []
+    for output_path, package, deps in outputs:
+        deps = reduce_dependencies(deps, package, **config["reduce"])
+        attributes = depth_attributes(deps, next(iter(deps))) if render["color_by_depth"] else None
+        reduced.append((output_path, deps, attributes))
     
-    print("Визуализация графа с помощью Graphviz...")
-    render_graph(dot_path, config["graphviz_path"], config["output_path"])
+    if exports:
+        print("Экспорт графа без раскладки в Graphviz...")
+        for output_path, deps, attributes in reduced:
+            for fmt in exports:
+                save_export(deps, output_path, fmt, attributes)
+    
+    if formats and render["pipe"]:
+        print("Визуализация графа с помощью Graphviz (DOT передаётся через канал)...")
+        with ThreadPoolExecutor(max_workers=render["workers"]) as pool:
+            futures = [
+                pool.submit(pipe_dot, iter_dot(deps, attributes), config["graphviz_path"], output_path, fmt)
+                for output_path, deps, attributes in reduced
+                for fmt in formats
+            ]
+            for future in futures:
+                future.result()
+    elif formats:
+        print("Генерация и сохранение графа зависимостей (DOT)...")
+        jobs = []
+        for output_path, deps, attributes in reduced:
+            dot_path = save_dot_to_file(iter_dot(deps, attributes), output_path)
+            jobs.extend((dot_path, output_path, fmt, len(deps)) for fmt in formats)
+        
+        print("Визуализация графа с помощью Graphviz...")
+        render_graphs(jobs, config["graphviz_path"], render["workers"], render["timeout"], render["sfdp_threshold"])
     
     print("Процесс завершён успешно!")
 
 
+def load_query_graph(config):
+    """Загружает граф для запросов: весь репозиторий или, если он не задан, граф APK-пакета."""
+    if config["repository_url"]:
+        return load_repository_graph(config["repository_url"], config["cache_dir"])
+    return DependencyGraph.from_dependencies(parse_dependencies(config["package_path"], ""))
+
+
+def run_query(config_path, command, packages, depth=2):
+    """
+    Выполняет запрос к графу зависимостей:
+    rdeps — обратное транзитивное замыкание, path — кратчайший путь между двумя пакетами,
+    subgraph — подграф пакета с ограничением глубины (сохраняется и визуализируется).
+    """
+    config = read_config(config_path)
+    graph = load_query_graph(config)
+    if command == "rdeps":
+        result = graph.reverse_closure(packages[0])
+        print(f"От пакета {packages[0]} транзитивно зависят пакетов: {len(result)}")
+        for name in result:
+            print(f"    {name}")
+    elif command == "path":
+        result = graph.shortest_path(packages[0], packages[1])
+        if result is None:
+            print(f"Пакет {packages[0]} не зависит от {packages[1]}.")
+        else:
+            print(" -> ".join(result))
+    elif command == "subgraph":
+        subgraph = graph.subgraph(packages[0], depth)
+        output_path = subgraph_output_path(config["output_path"], packages[0])
+        render = config["render"]
+        exports, formats = split_formats(render["formats"])
+        for fmt in exports:
+            save_export(subgraph, output_path, fmt)
+        result = save_dot_to_file(iter_dot(subgraph), output_path)
+        jobs = [(result, output_path, fmt, len(subgraph)) for fmt in formats]
+        render_graphs(jobs, config["graphviz_path"], render["workers"], render["timeout"], render["sfdp_threshold"])
+    else:
+        raise ValueError(f"Неизвестный запрос: {command}")
+    return result
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Визуализация графа зависимостей APK-пакета.")
     parser.add_argument("config", help="Путь к конфигурационному файлу.")
+    queries = parser.add_subparsers(dest="command", title="запросы к графу зависимостей")
+    rdeps_parser = queries.add_parser("rdeps", help="Пакеты, транзитивно зависящие от указанного.")
+    rdeps_parser.add_argument("packages", nargs=1, metavar="package")
+    path_parser = queries.add_parser("path", help="Кратчайшая цепочка зависимостей между пакетами.")
+    path_parser.add_argument("packages", nargs=2, metavar=("source", "target"))
+    subgraph_parser = queries.add_parser("subgraph", help="Подграф зависимостей пакета ограниченной глубины.")
+    subgraph_parser.add_argument("packages", nargs=1, metavar="package")
+    subgraph_parser.add_argument("--depth", type=int, default=2, help="Максимальная глубина подграфа.")
     args = parser.parse_args()
 
     try:
-        main(args.config)
+        if args.command is None:
+            main(args.config)
+        else:
+            run_query(args.config, args.command, args.packages, getattr(args, "depth", 2))
     except Exception as e:
         print(f"Ошибка: {e}")
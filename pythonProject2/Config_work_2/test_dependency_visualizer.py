@@ -4,8 +4,59 @@ from dependency_visualizer import (
     generate_dot,
     save_dot_to_file,
     render_graph,
+    load_repository_index,
+    read_pkginfo,
+    DependencyGraph,
+    load_repository_graph,
+    render_graphs,
+    iter_dot,
+    depth_attributes,
+    pipe_dot,
+    run_query,
+    version_key,
+    reduce_dependencies,
+    transitive_reduction,
+    collapse_cycles,
+    iter_json,
+    iter_graphml,
+    save_export,
 )
+import dependency_visualizer
+import io
 import os
+import sys
+import gzip
+import tarfile
+import tempfile
+import json
+import xml.etree.ElementTree as ET
+
+
+def make_tar_gz(path, files, segmented=False):
+    """Создаёт tar.gz; при segmented=True каждый файл пишется отдельным gzip-сегментом, как в APK."""
+    with open(path, "wb") as f:
+        for i, (name, data) in enumerate(files.items()):
+            buffer = io.BytesIO()
+            with tarfile.open(fileobj=buffer, mode="w") as tar:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            raw = buffer.getvalue()
+            if segmented and i < len(files) - 1:
+                raw = raw[:512 + (len(data) + 511) // 512 * 512]
+            f.write(gzip.compress(raw))
+            if not segmented:
+                break
+
+
+def make_apkindex(repo_dir, records):
+    """Создаёт APKINDEX.tar.gz из списка записей (имя, зависимости, provides[, версия])."""
+    text = "".join(
+        f"C:Q1abc=\nP:{name}\nV:{version[0] if version else '1.0-r0'}\n"
+        f"D:{' '.join(depends)}\np:{' '.join(provides)}\n\n"
+        for name, depends, provides, *version in records
+    )
+    make_tar_gz(os.path.join(repo_dir, "APKINDEX.tar.gz"), {"APKINDEX": text.encode("utf-8")})
 
 
 def test_read_config():
@@ -20,13 +71,210 @@ def test_read_config():
 
 def test_parse_dependencies():
     print("Тест: Разбор зависимостей")
-    dependencies = parse_dependencies("/path/to/package.apk", "http://example.com/repository")
+    with tempfile.TemporaryDirectory() as repo_dir:
+        make_apkindex(repo_dir, [("libA", [], []), ("libB", [], [])])
+        apk_path = os.path.join(repo_dir, "package.apk")
+        make_tar_gz(apk_path, {".PKGINFO": b"pkgname = package\ndepend = libA\ndepend = libB\n"})
+        dependencies = parse_dependencies(apk_path, "file://" + repo_dir)
     assert "package" in dependencies, "Ошибка: Зависимости для пакета не найдены."
     assert "libA" in dependencies["package"], "Ошибка: Зависимость libA не найдена."
     assert "libB" in dependencies["package"], "Ошибка: Зависимость libB не найдена."
     print("Проверка пройдена: Разбор зависимостей.\n")
 
 
+def test_parse_apk_repository():
+    print("Тест: Разбор APK-пакета и индекса репозитория")
+    with tempfile.TemporaryDirectory() as repo_dir:
+        make_apkindex(repo_dir, [
+            ("libA", ["so:libC.so.1", "!libOld"], []),
+            ("libB", ["libD>=2.0", "libE"], []),
+            ("libC", [], ["so:libC.so.1=1.0"]),
+            ("libD", [], []),
+            ("unrelated", ["libA"], []),
+        ])
+        apk_path = os.path.join(repo_dir, "package.apk")
+        pkginfo = b"# Generated\npkgname = package\npkgver = 1.0-r0\ndepend = libA\ndepend = libB<3\n"
+        make_tar_gz(apk_path, {".SIGN.RSA.key": b"sig", ".PKGINFO": pkginfo, "usr/bin/package": b"bin"},
+                    segmented=True)
+
+        assert read_pkginfo(apk_path) == ("package", ["libA", "libB<3"]), "Ошибка: .PKGINFO прочитан неверно."
+        index, canonical = load_repository_index(repo_dir)
+        assert index["libA"] == ("libC",), "Ошибка: so:-зависимость не сопоставлена с пакетом."
+        assert canonical["so:libC.so.1"] == "libC", "Ошибка: provides не прочитан."
+
+        dependencies = parse_dependencies(apk_path, "file://" + repo_dir)
+        assert dependencies == {
+            "package": ["libA", "libB"],
+            "libA": ["libC"],
+            "libB": ["libD", "libE"],
+            "libC": [],
+            "libD": [],
+            "libE": [],
+        }, "Ошибка: граф зависимостей построен неверно."
+    print("Проверка пройдена: Разбор APK-пакета и индекса репозитория.\n")
+
+
+def test_multiple_repositories():
+    print("Тест: Объединение нескольких репозиториев")
+    versions = ["1.0_rc1-r0", "1.0-r0", "1.0-r1", "1.0_p1-r0", "1.0a-r0", "1.0.1-r0", "1.2", "1.10"]
+    assert sorted(reversed(versions), key=version_key) == versions, "Ошибка: версии apk сравниваются неверно."
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        main_dir = os.path.join(temp_dir, "main")
+        community_dir = os.path.join(temp_dir, "community")
+        os.makedirs(main_dir)
+        os.makedirs(community_dir)
+        make_apkindex(main_dir, [
+            ("app", ["libA>=2.0", "libB"], []),
+            ("libA", ["libOld"], [], "1.5-r0"),
+            ("libB", ["so:libC.so"], []),
+        ])
+        make_apkindex(community_dir, [
+            ("libA", ["libNew"], [], "2.1-r0"),
+            ("libB", ["libUnused"], []),
+            ("libC", [], ["so:libC.so"]),
+        ])
+
+        timings = []
+        graph = load_repository_graph(f"file://{main_dir}, file://{community_dir}", timings=timings)
+        assert sorted(graph.closure("app")) == ["libA", "libB", "libC", "libNew"], \
+            "Ошибка: замыкание после объединения неверно."
+        assert [graph.names[node] for node in graph.successors(graph.ids["libA"])] == ["libNew"], \
+            "Ошибка: ограничение libA>=2.0 должно выбрать версию из второго репозитория."
+        assert [graph.names[node] for node in graph.successors(graph.ids["libB"])] == ["libC"], \
+            "Ошибка: пакет должен браться из более приоритетного репозитория."
+        assert [timing["repository"] for timing in timings] == [f"file://{main_dir}", f"file://{community_dir}"], \
+            "Ошибка: время загрузки должно сообщаться для каждого репозитория."
+
+        # Пустой список репозиториев и ошибка загрузки одного из них
+        try:
+            load_repository_graph(" ")
+            assert False, "Ошибка: пустой список репозиториев должен отклоняться."
+        except ValueError:
+            pass
+        opened = []
+        original_fetch = dependency_visualizer.fetch_repository_index
+
+        def recording_fetch(url):
+            result = original_fetch(url)
+            opened.append(result[0])
+            return result
+
+        dependency_visualizer.fetch_repository_index = recording_fetch
+        try:
+            load_repository_graph(f"file://{main_dir}, file://{temp_dir}/missing")
+            assert False, "Ошибка: отсутствующий репозиторий должен вызывать ошибку."
+        except FileNotFoundError:
+            assert opened and all(stream.closed for stream in opened), "Ошибка: открытые индексы должны закрываться."
+        finally:
+            dependency_visualizer.fetch_repository_index = original_fetch
+    print("Проверка пройдена: Объединение нескольких репозиториев.\n")
+
+
+def test_dependency_graph():
+    print("Тест: Транзитивное замыкание и поиск циклов")
+    graph = DependencyGraph.from_dependencies({
+        "package": ["libA", "libB"],
+        "libA": ["libC"],
+        "libB": ["libD"],
+        "libC": ["libA", "libE"],
+        "libD": ["libD"],
+    })
+    assert len(graph) == 6, "Ошибка: неизвестная зависимость libE не добавлена в граф."
+    assert sorted(graph.closure("package")) == ["libA", "libB", "libC", "libD", "libE"], \
+        "Ошибка: транзитивное замыкание пакета неверно."
+    assert sorted(graph.closure("libA")) == ["libA", "libC", "libE"], "Ошибка: пакет на цикле должен входить в своё замыкание."
+    assert graph.closure("libE") == [], "Ошибка: у листа не должно быть зависимостей."
+    assert sorted(graph.cycles()) == [["libA", "libC"], ["libD"]], "Ошибка: циклы найдены неверно."
+    sizes = graph.resolve_all()
+    assert sizes["package"] == 5 and sizes["libB"] == 1 and sizes["libE"] == 0, "Ошибка: размеры замыканий неверны."
+
+    # Длинная цепочка не должна упираться в ограничение глубины рекурсии
+    chain = {f"p{i}": [f"p{i + 1}"] for i in range(20000)}
+    assert len(DependencyGraph.from_dependencies(chain).closure("p0")) == 20000, "Ошибка: замыкание цепочки неверно."
+    print("Проверка пройдена: Транзитивное замыкание и поиск циклов.\n")
+
+
+def test_dependency_queries():
+    print("Тест: Обратные зависимости, кратчайший путь и подграф")
+    graph = DependencyGraph.from_dependencies({
+        "package": ["libA", "libB"],
+        "libA": ["libC"],
+        "libB": ["libC", "libD"],
+        "libC": ["libE"],
+        "tool": ["libD"],
+    })
+    assert graph.reverse_closure("libC") == ["libA", "libB", "package"], "Ошибка: обратное замыкание неверно."
+    assert sorted(graph.reverse_closure("libD")) == ["libB", "package", "tool"], "Ошибка: обратное замыкание неверно."
+    assert graph.shortest_path("package", "libE") == ["package", "libA", "libC", "libE"], "Ошибка: кратчайший путь неверен."
+    assert graph.shortest_path("libE", "package") is None, "Ошибка: несуществующий путь должен давать None."
+    assert graph.subgraph("package", 1) == {"package": ["libA", "libB"], "libA": [], "libB": []}, \
+        "Ошибка: подграф с ограничением глубины неверен."
+
+    with tempfile.TemporaryDirectory() as repo_dir:
+        make_apkindex(repo_dir, [("libA", ["libB"], []), ("libB", ["so:libC.so"], []), ("libC", [], ["so:libC.so"])])
+        config_path = os.path.join(repo_dir, "config.ini")
+        with open(config_path, "w") as f:
+            f.write(f"[Paths]\ngraphviz_path = dot\npackage_path = none.apk\noutput_path = {repo_dir}/graph.png\n"
+                    f"repository_url = file://{repo_dir}\ncache_dir = {repo_dir}/cache\n")
+        assert run_query(config_path, "rdeps", ["so:libC.so"]) == ["libB", "libA"], "Ошибка: запрос rdeps неверен."
+        assert run_query(config_path, "path", ["libA", "libC"]) == ["libA", "libB", "libC"], "Ошибка: запрос path неверен."
+        # Обратный индекс сохраняется в кэше вместе с прямым
+        assert isinstance(load_repository_graph(f"file://{repo_dir}", f"{repo_dir}/cache").reverse_targets, memoryview), \
+            "Ошибка: обратный индекс должен загружаться из кэша."
+    print("Проверка пройдена: Обратные зависимости, кратчайший путь и подграф.\n")
+
+
+def test_graph_reductions():
+    print("Тест: Упрощение графа зависимостей")
+    dependencies = {
+        "package": ["libA", "libB", "libC"],
+        "libA": ["libC"],
+        "libB": ["libX"],
+        "libX": ["libB", "libC"],
+        "libC": ["libD"],
+    }
+    assert collapse_cycles(dependencies) == {
+        "package": ["libA", "libB, libX", "libC"],
+        "libA": ["libC"],
+        "libB, libX": ["libC"],
+        "libC": ["libD"],
+    }, "Ошибка: циклы свёрнуты неверно."
+    reduced = transitive_reduction(dependencies)
+    assert reduced["package"] == ["libA", "libB, libX"], "Ошибка: транзитивная редукция неверна."
+    assert reduced["libA"] == ["libC"], "Ошибка: необходимое ребро удалено."
+    assert reduce_dependencies(dependencies, "package", depth=1) == {
+        "package": ["libA", "libB", "libC"], "libA": ["libC"], "libB": [], "libC": [],
+    }, "Ошибка: ограничение глубины неверно."
+    assert reduce_dependencies(dependencies, "package", pattern="libX*") == {"package": [], "libX": []}, \
+        "Ошибка: фильтр по шаблону неверен."
+    print("Проверка пройдена: Упрощение графа зависимостей.\n")
+
+
+def test_repository_graph_cache():
+    print("Тест: Кэш графа репозитория")
+    with tempfile.TemporaryDirectory() as repo_dir:
+        cache_dir = os.path.join(repo_dir, "cache")
+        make_apkindex(repo_dir, [("libA", ["so:libB.so"], []), ("libB", [], ["so:libB.so=1"])])
+
+        graph = load_repository_graph(repo_dir, cache_dir)
+        assert len(os.listdir(cache_dir)) == 1, "Ошибка: кэш графа не создан."
+        cached = load_repository_graph(repo_dir, cache_dir)
+        assert isinstance(cached.targets, memoryview), "Ошибка: граф должен загружаться из кэша."
+        assert cached.names == graph.names, "Ошибка: имена в кэше не совпадают."
+        assert cached.closure("libA") == ["libB"], "Ошибка: рёбра в кэше не совпадают."
+        assert cached.ids["so:libB.so"] == cached.ids["libB"], "Ошибка: псевдонимы в кэше не совпадают."
+
+        # Изменение индекса инвалидирует кэш
+        make_apkindex(repo_dir, [("libA", [], []), ("libC", ["libA"], [])])
+        rebuilt = load_repository_graph(repo_dir, cache_dir)
+        assert not isinstance(rebuilt.targets, memoryview), "Ошибка: устаревший кэш должен перестраиваться."
+        assert rebuilt.closure("libC") == ["libA"], "Ошибка: граф после изменения индекса неверен."
+        assert load_repository_graph(repo_dir, cache_dir).closure("libC") == ["libA"], \
+            "Ошибка: обновлённый кэш неверен."
+    print("Проверка пройдена: Кэш графа репозитория.\n")
+
+
 def test_generate_dot():
     print("Тест: Генерация DOT-файла")
     dependencies = {
@@ -42,6 +290,52 @@ def test_generate_dot():
     print("Проверка пройдена: Генерация DOT-файла.\n")
 
 
+def test_iter_dot():
+    print("Тест: Потоковая генерация DOT с атрибутами")
+    dependencies = {"package": ['lib"quoted"', "lib\\path"], 'lib"quoted"': ["libC"]}
+    lines = iter_dot(dependencies, depth_attributes(dependencies, "package"), {("package", "lib\\path"): {"color": "red"}})
+    assert next(lines) == "digraph Dependencies {", "Ошибка: iter_dot должен выдавать строки по одной."
+    lines = list(lines)
+    assert '    "package" -> "lib\\"quoted\\"";' in lines, "Ошибка: кавычки в имени не экранированы."
+    assert '    "package" -> "lib\\\\path" [color="red"];' in lines, "Ошибка: атрибуты ребра или обратный слэш неверны."
+    assert '    "libC" [style="filled", fillcolor="#fee08b"];' in lines, "Ошибка: цвет по глубине неверен."
+    assert lines[-1] == "}", "Ошибка: конец DOT-файла отсутствует."
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        dot_path = save_dot_to_file(iter_dot(dependencies), os.path.join(temp_dir, "graph"))
+        with open(dot_path, encoding="utf-8") as f:
+            assert f.read().count(" -> ") == 3, "Ошибка: DOT-файл из генератора записан неверно."
+        target = pipe_dot(iter_dot(dependencies), make_fake_graphviz(temp_dir), os.path.join(temp_dir, "graph"), "svg")
+        with open(target, encoding="utf-8") as f:
+            assert '"package" -> "lib\\"quoted\\"";' in f.read(), "Ошибка: DOT не передан через канал."
+    print("Проверка пройдена: Потоковая генерация DOT с атрибутами.\n")
+
+
+def test_export_formats():
+    print("Тест: Экспорт графа в JSON, GraphML и HTML")
+    dependencies = {"package": ["libA", "</script>"], "libA": ["</script>"]}
+    attributes = depth_attributes(dependencies, "package")
+    graph = json.loads("".join(iter_json(dependencies, attributes)))
+    assert [node["name"] for node in graph["nodes"]] == ["package", "libA", "</script>"], "Ошибка: порядок узлов JSON неверен."
+    assert [node["deps"] for node in graph["nodes"]] == [[1, 2], [2], []], "Ошибка: списки смежности JSON неверны."
+    assert graph["nodes"][2]["attributes"]["fillcolor"] == "#fdae61", "Ошибка: атрибуты узла не сохранены в JSON."
+
+    root = ET.fromstring("\n".join(iter_graphml(dependencies, attributes, {("libA", "</script>"): {"color": "red"}})))
+    ns = {"g": "http://graphml.graphdrawing.org/xmlns"}
+    names = [node.find("g:data[@key='name']", ns).text for node in root.iter("{%s}node" % ns["g"])]
+    assert names == ["package", "libA", "</script>"], "Ошибка: узлы GraphML неверны."
+    edges = [(edge.get("source"), edge.get("target")) for edge in root.iter("{%s}edge" % ns["g"])]
+    assert edges == [("n0", "n1"), ("n0", "n2"), ("n1", "n2")], "Ошибка: рёбра GraphML неверны."
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        html_path = save_export(dependencies, os.path.join(temp_dir, "graph.png"), "html", attributes)
+        assert html_path.name == "graph.html", "Ошибка: неверное имя HTML-файла."
+        page = html_path.read_text(encoding="utf-8")
+        assert page.count("</script>") == 1, "Ошибка: данные графа не экранированы внутри <script>."
+        assert '"name":"<\\/script>"' in page, "Ошибка: граф не встроен в HTML."
+    print("Проверка пройдена: Экспорт графа в JSON, GraphML и HTML.\n")
+
+
 def test_save_dot_to_file():
     print("Тест: Сохранение DOT-файла")
     dot_content = 'digraph Dependencies {\n    "package" -> "libA";\n}'
@@ -68,13 +362,69 @@ def test_render_graph():
     print("Проверка пройдена: Рендеринг графа.\n")
 
 
+FAKE_GRAPHVIZ = """
+import sys, time
+args = sys.argv[1:]
+with open(sys.argv[0] + ".log", "a") as log:
+    log.write(" ".join(args) + "\\n")
+source = sys.stdin.read() if args[1] == "-o" else open(args[-3]).read()
+if "-Ksfdp" not in args and "slow" in source:
+    time.sleep(5)
+with open(args[-1], "w") as f:
+    f.write(args[0] if args[1] != "-o" else source)
+"""
+
+
+def make_fake_graphviz(directory):
+    """Создаёт исполняемый файл, имитирующий Graphviz и записывающий свои вызовы в журнал."""
+    path = os.path.join(directory, "fake_dot")
+    with open(path, "w") as f:
+        f.write(f"#!{sys.executable}\n{FAKE_GRAPHVIZ}")
+    os.chmod(path, 0o755)
+    return path
+
+
+def test_render_graphs():
+    print("Тест: Параллельный рендеринг с кэшированием")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        graphviz_path = make_fake_graphviz(temp_dir)
+        output_path = os.path.join(temp_dir, "graph")
+        dot_path = save_dot_to_file('digraph Dependencies {\n    "package" -> "libA";\n}', output_path)
+        jobs = [(dot_path, output_path, "png", None), (dot_path, output_path, "svg", None)]
+
+        results = render_graphs(jobs, graphviz_path, workers=2)
+        assert [engine for _, engine in results] == ["dot", "dot"], "Ошибка: оба формата должны быть отрисованы."
+        assert open(results[1][0]).read() == "-Tsvg", "Ошибка: SVG отрисован неверно."
+
+        # Неизменённый DOT-файл повторно не рендерится
+        results = render_graphs(jobs, graphviz_path, workers=2)
+        assert [engine for _, engine in results] == [None, None], "Ошибка: результат должен браться из кэша."
+        with open(graphviz_path + ".log") as log:
+            assert len(log.readlines()) == 2, "Ошибка: Graphviz не должен вызываться повторно."
+
+        # Большой граф, не уложившийся в тайм-аут, раскладывается sfdp
+        dot_path = save_dot_to_file('digraph Dependencies {\n    "slow" -> "libA";\n}', output_path)
+        results = render_graphs(jobs[:1], graphviz_path, timeout=0.5, sfdp_threshold=1)
+        assert results[0][1] == "sfdp", "Ошибка: после тайм-аута должен использоваться sfdp."
+    print("Проверка пройдена: Параллельный рендеринг с кэшированием.\n")
+
+
 if __name__ == "__main__":
     try:
         test_read_config()
         test_parse_dependencies()
+        test_parse_apk_repository()
+        test_multiple_repositories()
+        test_dependency_graph()
+        test_dependency_queries()
+        test_graph_reductions()
+        test_repository_graph_cache()
         test_generate_dot()
+        test_iter_dot()
+        test_export_formats()
         test_save_dot_to_file()
         test_render_graph()
+        test_render_graphs()
         print("Все тесты пройдены успешно!")
     except AssertionError as e:
         print(f"Тест завершился неудачей: {e}")
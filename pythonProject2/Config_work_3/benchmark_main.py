@@ -0,0 +1,132 @@
+# benchmark_main.py
+
+import sys
+import time
+import argparse
+import re
+import xml.etree.ElementTree as ET
+
+from main import convert_to_custom_language
+
+# Исходная версия конвертера (до табличного классификатора), для сравнения
+def legacy_convert_to_custom_language(xml_root):
+    output = []
+    variables = {}  # Хранилище для вычисленных значений
+
+    def process_element(element):
+        name = element.tag
+        if not re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", name):
+            raise Exception(f"Invalid name: '{name}'")
+
+        # Если элемент имеет текстовое значение
+        if element.text and element.text.strip():
+            value = element.text.strip()
+
+            # Если текст является ссылкой на другую переменную
+            if value.startswith("!(") and value.endswith(")"):
+                ref_name = value[2:-1]  # Извлекаем имя переменной
+                if ref_name not in variables:
+                    raise Exception(f"Undefined reference: '{ref_name}' in element '{name}'")
+                value = variables[ref_name]  # Подставляем значение переменной
+
+            elif value.isdigit():
+                value = int(value)  # Преобразуем числовое значение
+            else:
+                raise Exception(f"Invalid value: '{value}' for key '{name}'")
+
+            # Сохраняем переменную для последующего использования
+            variables[name] = value
+            output.append(f"let {name} = {value};")
+
+        # Если элемент имеет дочерние элементы
+        elif len(element):
+            output.append(f"let {name} = [")
+            for child in element:
+                child_name = child.tag
+                child_value = child.text.strip() if child.text and child.text.strip() else None
+
+                if not re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", child_name):
+                    raise Exception(f"Invalid name: '{child_name}' in dictionary")
+
+                # Если текст является ссылкой на другую переменную
+                if child_value and child_value.startswith("!(") and child_value.endswith(")"):
+                    ref_name = child_value[2:-1]
+                    if ref_name not in variables:
+                        raise Exception(f"Undefined reference: '{ref_name}' in element '{child_name}'")
+                    child_value = variables[ref_name]
+
+                elif child_value and child_value.isdigit():
+                    child_value = int(child_value)
+
+                elif child_value:
+                    raise Exception(f"Invalid value: '{child_value}' for key '{child_name}'")
+
+                output.append(f"    {child_name} => {child_value},")
+                variables[child_name] = child_value  # Сохраняем значение переменной
+
+            output.append("];")
+        else:
+            raise Exception(f"Element '{name}' must have either a numeric value or child elements.")
+
+    for element in xml_root:
+        process_element(element)
+
+    return "\n".join(output)
+
+def make_wide_dictionary(width, distinct_names):
+    # Один словарь из width числовых ключей; distinct_names ограничивает число разных имён
+    children = "".join(f"<key{i % distinct_names}>{i}</key{i % distinct_names}>" for i in range(width))
+    return ET.fromstring(f"<config><wide>{children}</wide></config>")
+
+def make_constants(count):
+    # Много констант верхнего уровня, каждая пятая — ссылка на предыдущую
+    elements = "".join(
+        f"<c{i}>!(c{i - 1})</c{i}>" if i % 5 else f"<c{i}>{i}</c{i}>" for i in range(count)
+    )
+    return ET.fromstring(f"<config>{elements}</config>")
+
+def make_mixed(count):
+    # Смешанный документ: числа, ссылки и небольшие словари из чисел и ссылок, по 6 элементов в группе
+    groups = "".join(
+        f"<n{i}>{i}</n{i}><r{i}>!(n{i})</r{i}><d{i}><a>{i}</a><b>!(r{i})</b><c>7</c></d{i}>"
+        for i in range(count // 6)
+    )
+    return ET.fromstring(f"<config>{groups}</config>")
+
+SCENARIOS = {
+    "wide dictionary, unique names": lambda size: make_wide_dictionary(size, size),
+    "wide dictionary, 100 names": lambda size: make_wide_dictionary(size, 100),
+    "top-level constants": make_constants,
+    "mixed values": make_mixed,
+}
+
+def best_rates(functions, root, elements, repeats):
+    # Функции запускаются поочерёдно, чтобы колебания нагрузки на машине сказывались на всех одинаково
+    best = [float("inf")] * len(functions)
+    for _ in range(repeats):
+        for i, function in enumerate(functions):
+            started = time.perf_counter()
+            function(root)
+            best[i] = min(best[i], time.perf_counter() - started)
+    return [elements / elapsed for elapsed in best]
+
+def run_benchmark(size, repeats):
+    print(f"\n{size} elements per scenario (best of {repeats})")
+    for label, make_root in SCENARIOS.items():
+        root = make_root(size)
+        elements = sum(1 for _ in root.iter()) - 1
+        if legacy_convert_to_custom_language(root) != convert_to_custom_language(root):
+            raise Exception(f"Output mismatch in scenario '{label}'")
+        legacy, current = best_rates((legacy_convert_to_custom_language, convert_to_custom_language), root, elements, repeats)
+        print(f"  {label:<30} legacy {legacy:12,.0f} el/s  current {current:12,.0f} el/s  x{current / legacy:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare convert_to_custom_language with the legacy converter.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Elements per scenario")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per measurement; the best one is reported")
+    args = parser.parse_args()
+    for size in args.sizes:
+        run_benchmark(size, args.repeats)
+
+if __name__ == "__main__":
+    sys.exit(main())
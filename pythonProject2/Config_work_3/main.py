@@ -1,109 +1,610 @@
-import argparse
-import re
-import sys
-import xml.etree.ElementTree as ET
-
-def parse_args():
-    parser = argparse.ArgumentParser(description="Convert XML configuration to custom configuration language.")
-    parser.add_argument("input_file_path", type=str, help="Path to the input XML file")
-    parser.add_argument("--output_file", type=str, help="Optional output file path for the converted configuration", default=None)
-    return parser.parse_args()
-
-def read_input_file(file_path):
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
-    except FileNotFoundError:
-        raise Exception(f"Input file not found: {file_path}")
-
-def validate_xml(xml_data):
-    try:
-        return ET.fromstring(xml_data)
-    except ET.ParseError as e:
-        raise Exception(f"Invalid XML format: {e}")
-
-def convert_to_custom_language(xml_root):
-    output = []
-    variables = {}  # Хранилище для вычисленных значений
-
-    def process_element(element):
-        name = element.tag
-        if not re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", name):
-            raise Exception(f"Invalid name: '{name}'")
-
-        # Если элемент имеет текстовое значение
-        if element.text and element.text.strip():
-            value = element.text.strip()
-
-            # Если текст является ссылкой на другую переменную
-            if value.startswith("!(") and value.endswith(")"):
-                ref_name = value[2:-1]  # Извлекаем имя переменной
-                if ref_name not in variables:
-                    raise Exception(f"Undefined reference: '{ref_name}' in element '{name}'")
-                value = variables[ref_name]  # Подставляем значение переменной
-
-            elif value.isdigit():
-                value = int(value)  # Преобразуем числовое значение
-            else:
-                raise Exception(f"Invalid value: '{value}' for key '{name}'")
-
-            # Сохраняем переменную для последующего использования
-            variables[name] = value
-            output.append(f"let {name} = {value};")
-
-        # Если элемент имеет дочерние элементы
-        elif len(element):
-            output.append(f"let {name} = [")
-            for child in element:
-                child_name = child.tag
-                child_value = child.text.strip() if child.text and child.text.strip() else None
-
-                if not re.match(r"^[a-zA-Z_][a-zA-Z0-9_]*$", child_name):
-                    raise Exception(f"Invalid name: '{child_name}' in dictionary")
-
-                # Если текст является ссылкой на другую переменную
-                if child_value and child_value.startswith("!(") and child_value.endswith(")"):
-                    ref_name = child_value[2:-1]
-                    if ref_name not in variables:
-                        raise Exception(f"Undefined reference: '{ref_name}' in element '{child_name}'")
-                    child_value = variables[ref_name]
-
-                elif child_value and child_value.isdigit():
-                    child_value = int(child_value)
-
-                elif child_value:
-                    raise Exception(f"Invalid value: '{child_value}' for key '{child_name}'")
-
-                output.append(f"    {child_name} => {child_value},")
-                variables[child_name] = child_value  # Сохраняем значение переменной
-
-            output.append("];")
-        else:
-            raise Exception(f"Element '{name}' must have either a numeric value or child elements.")
-
-    for element in xml_root:
-        process_element(element)
-
-    return "\n".join(output)
-
-def main():
-    args = parse_args()
-
-    try:
-        xml_data = read_input_file(args.input_file_path)
-        xml_root = validate_xml(xml_data)
-        custom_config = convert_to_custom_language(xml_root)
-
-        if args.output_file:
-            with open(args.output_file, "w", encoding="utf-8") as file:
-                file.write(custom_config)
-            print(f"Converted configuration written to: {args.output_file}")
-        else:
-            print("Converted Configuration:")
-            print(custom_config)
-
-    except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
-
-if __name__ == "__main__":
-    main()
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert XML configuration to custom configuration language.")
+    parser.add_argument("input_file_path", type=str, help="Path to the input XML file, or a directory or glob pattern for batch mode")
+    parser.add_argument("--output_file", type=str, help="Optional output file path for the converted configuration", default=None)
+    parser.add_argument("--stream", action="store_true", help="Translate with iterparse, writing each top-level element as soon as it closes")
+    parser.add_argument("--output_dir", type=str, help="Batch mode: directory for the translated files", default=None)
+    parser.add_argument("--jobs", type=int, help="Batch mode: number of worker processes (default: CPU count)", default=None)
+    parser.add_argument("--manifest", type=str, help="Batch mode: content-hash manifest path (default: <output_dir>/.translation-manifest.json)", default=None)
+    return parser.parse_args()
+
+def read_input_file(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8") as file:
+            return file.read()
+    except FileNotFoundError:
+        raise Exception(f"Input file not found: {file_path}")
+
+def validate_xml(xml_data):
+    try:
+        return ET.fromstring(xml_data)
+    except ET.ParseError as e:
+        raise Exception(f"Invalid XML format: {e}")
+
+# Имя константы или ключа словаря. Имена элементов и ссылки !(name) проверяются через isascii() и isidentifier():
+# для ASCII-строк это то же правило, но без вызова регулярного выражения
+NAME_RE = re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*")
+
+# Состояния Constant: заготовка под ссылку вперёд, ожидает вычисления, вычисляется, вычислена
+UNBOUND, PENDING, VISITING, DONE = range(4)
+
+# Значение выражения, зависящего от ещё не вычисленных констант; вычисляется один раз в Scope.resolve
+class Constant:
+    __slots__ = ("name", "expression", "deps", "value", "state", "referrer")
+
+    def __init__(self, name, expression=None, deps=(), state=PENDING, referrer=None):
+        self.name = name
+        self.expression = expression
+        self.deps = deps
+        self.value = None
+        self.state = state
+        self.referrer = referrer
+
+# Именованные значения документа. Ссылка связывается с последним определением до неё,
+# а если его нет — с первым после неё (такие ссылки ждут в forward)
+class Scope:
+    __slots__ = ("values", "forward", "pending")
+
+    def __init__(self):
+        self.values = {}
+        self.forward = {}
+        self.pending = []
+
+    def reference(self, name, referrer):
+        value = self.values.get(name, Scope)
+        if value is Scope:
+            node = self.forward.get(name)
+            if node is None:
+                node = self.forward[name] = Constant(name, state=UNBOUND, referrer=referrer)
+            return node
+        if value.__class__ is Constant and value.state == DONE:
+            return value.value
+        return value
+
+    def define(self, name, value):
+        node = self.forward.pop(name, None) if self.forward else None
+        if node is not None:
+            if value.__class__ is Constant and value.state != DONE:
+                node.expression = value
+                node.deps = [value]
+                node.state = PENDING
+                self.pending.append(node)
+            else:
+                node.value = value.value if value.__class__ is Constant else value
+                node.state = DONE
+        self.values[name] = value
+
+    def check_defined(self):
+        for node in self.forward.values():
+            raise Exception(f"Undefined reference: '{node.name}' in element '{node.referrer}'")
+
+    # Вычисляет отложенные константы в порядке зависимостей
+    def resolve(self):
+        for node in self.pending:
+            if node.state != DONE:
+                resolve_constant(node)
+        self.pending.clear()
+
+def resolve_constant(node):
+    # Обход в глубину без рекурсии: константа вычисляется после всех своих зависимостей
+    node.state = VISITING
+    path = [(node, iter(node.deps))]
+    while path:
+        current, deps = path[-1]
+        for dep in deps:
+            if dep.state == DONE:
+                continue
+            if dep.state == VISITING:
+                cycle = [entry[0].name for entry in path[[entry[0] for entry in path].index(dep):]] + [dep.name]
+                names = [name for i, name in enumerate(cycle) if i == 0 or name != cycle[i - 1]]
+                raise Exception(f"Circular reference: {' -> '.join(names)}")
+            if dep.state == UNBOUND:
+                raise Exception(f"Undefined reference: '{dep.name}' in element '{dep.referrer}'")
+            dep.state = VISITING
+            path.append((dep, iter(dep.deps)))
+            break
+        else:
+            current.value = evaluate(current.expression, current.name)
+            current.state = DONE
+            path.pop()
+
+def format_value(value):
+    if value.__class__ is Constant:
+        value = value.value
+    if value.__class__ is str:
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return str(value)
+
+NUMBER = (int,)
+TEXT_OR_NUMBER = (int, str)
+STRING = (str,)
+# Операции выражений: имя -> (минимум аргументов, максимум или None, допустимые типы аргументов, функция)
+OPERATIONS = {
+    "+": (2, None, NUMBER, lambda *args: sum(args)),
+    "-": (1, 2, NUMBER, lambda a, b=None: -a if b is None else a - b),
+    "*": (2, None, NUMBER, lambda *args: math.prod(args)),
+    "/": (2, 2, NUMBER, lambda a, b: a // b),
+    "mod": (2, 2, NUMBER, lambda a, b: a % b),
+    "min": (1, None, NUMBER, lambda *args: min(args)),
+    "max": (1, None, NUMBER, lambda *args: max(args)),
+    "abs": (1, 1, NUMBER, abs),
+    "concat": (1, None, TEXT_OR_NUMBER, lambda *args: "".join(map(str, args))),
+    "len": (1, 1, STRING, len),
+}
+# Лексемы выражения: скобка, строка в двойных кавычках, целое число, имя или операция
+TOKEN_RE = re.compile(r'\s*(?:([()])|("(?:[^"\\]|\\.)*")|(-?[0-9]+)(?![^\s()])|([^\s()"]+))')
+# Выражение целиком состоит из лексем, поэтому findall не пропустит ни одного символа
+TOKENS_RE = re.compile(r'(?:\s*(?:[()]|"(?:[^"\\]|\\.)*"|-?[0-9]+(?![^\s()])|[^\s()"]+))*\s*')
+ESCAPE_RE = re.compile(r"\\(.)")
+
+# Вычисляет дерево выражения с явным стеком: литерал, Constant или (операция, аргументы)
+def evaluate(tree, name):
+    if tree.__class__ is not tuple:
+        return tree.value if tree.__class__ is Constant else tree
+    # Кадр стека: (операция, итератор по аргументам, уже вычисленные значения)
+    stack = [(tree[0], iter(tree[1]), [])]
+    while True:
+        operation, args, values = stack[-1]
+        for arg in args:
+            if arg.__class__ is tuple:
+                stack.append((arg[0], iter(arg[1]), []))
+                break
+            values.append(arg.value if arg.__class__ is Constant else arg)
+        else:
+            types, function = OPERATIONS[operation][2:]
+            for value in values:
+                if value.__class__ not in types:
+                    raise Exception(f"Invalid operand for '{operation}' in element '{name}': {format_value(value)}")
+            try:
+                result = function(*values)
+            except ZeroDivisionError:
+                raise Exception(f"Division by zero in element '{name}'")
+            stack.pop()
+            if not stack:
+                return result
+            stack[-1][2].append(result)
+
+# Разбирает префиксное выражение без рекурсии; возвращает (дерево, невычисленные зависимости)
+def parse_call(text, name, scope):
+    if not TOKENS_RE.fullmatch(text):
+        raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+    stack = []
+    tree = None
+    deps = []
+    for paren, string, number, word in TOKEN_RE.findall(text):
+        if tree is not None:
+            raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+        if paren == "(":
+            if stack and not stack[-1]:
+                # Операцией может быть только имя, а не вложенное выражение
+                raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+            stack.append([])
+            continue
+        if not stack:
+            raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+        if paren == ")":
+            items = stack.pop()
+            if not items:
+                raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+            minimum, maximum = OPERATIONS[items[0]][:2]
+            if len(items) - 1 < minimum or maximum is not None and len(items) - 1 > maximum:
+                raise Exception(f"Wrong number of arguments for '{items[0]}' in element '{name}'")
+            call = (items[0], tuple(items[1:]))
+            if stack:
+                stack[-1].append(call)
+            else:
+                tree = call
+            continue
+        if not stack[-1]:
+            # Первая лексема в скобках — операция
+            if word not in OPERATIONS:
+                raise Exception(f"Unknown operation: '{paren or string or number or word}' in element '{name}'")
+            stack[-1].append(word)
+        elif string:
+            stack[-1].append(ESCAPE_RE.sub(r"\1", string[1:-1]))
+        elif number:
+            stack[-1].append(int(number))
+        elif NAME_RE.fullmatch(word):
+            value = scope.reference(word, name)
+            if value.__class__ is Constant:
+                deps.append(value)
+            stack[-1].append(value)
+        else:
+            raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+    if tree is None:
+        raise Exception(f"Invalid expression: '{text}' for key '{name}'")
+    return tree, deps
+
+def parse_number(name, value, scope):
+    if not value.isdecimal():
+        raise Exception(f"Invalid value: '{value}' for key '{name}'")
+    return int(value)
+
+def parse_expression(name, value, scope):
+    # Ссылка !(name) или выражение в префиксной записи: !(+ width 10), !(max a (* b 2))
+    if not value.startswith("!(") or not value.endswith(")"):
+        raise Exception(f"Invalid value: '{value}' for key '{name}'")
+    inner = value[2:-1]
+    if inner.isascii() and inner.isidentifier():
+        target = scope.reference(inner, name)
+        if target.__class__ is not Constant:
+            return target
+        tree, deps = target, [target]
+    else:
+        tree, deps = parse_call(value[1:], name, scope)
+        if not deps:
+            return evaluate(tree, name)
+    node = Constant(name, tree, deps)
+    scope.pending.append(node)
+    return node
+
+def parse_invalid(name, value, scope):
+    raise Exception(f"Invalid value: '{value}' for key '{name}'")
+
+# Вид значения определяется по первому символу за один словарный поиск
+VALUE_PARSERS = dict.fromkeys("0123456789", parse_number)
+VALUE_PARSERS["!"] = parse_expression
+
+# Отступ растёт с глубиной вложенности только до этого уровня, иначе размер вывода
+# для документа глубиной N рос бы как N^2
+MAX_INDENT_LEVEL = 64
+INDENTS = ["    " * level for level in range(MAX_INDENT_LEVEL + 1)]
+
+# Узел словаря: параллельные списки ключей и значений; nested — есть ли вложенные контейнеры
+class Dictionary:
+    __slots__ = ("names", "values", "nested")
+
+    def __init__(self):
+        self.names = []
+        self.values = []
+        self.nested = False
+
+# Узел массива (элемент с type="array"): значения в порядке документа
+class Array:
+    __slots__ = ("values", "nested")
+
+    def __init__(self):
+        self.values = []
+        self.nested = False
+
+CONTAINERS = (Dictionary, Array)
+
+def new_container(element):
+    return Array() if element.get("type") == "array" else Dictionary()
+
+# Строит AST поддерева без рекурсии; ключевые скаляры определяются в scope по порядку документа
+def build_value(element, scope):
+    root = new_container(element)
+    stack = [(root, iter(element))]
+    values = scope.values
+    while stack:
+        node, children = stack[-1]
+        names = None if node.__class__ is Array else node.names
+        append = node.values.append
+        for child in children:
+            child_name = child.tag
+            if not (child_name.isascii() and child_name.isidentifier()):
+                raise Exception(f"Invalid name: '{child_name}' in {'dictionary' if names is not None else 'array'}")
+            text = child.text
+            child_value = text.strip() if text else ""
+            if child_value:
+                child_value = VALUE_PARSERS.get(child_value[0], parse_invalid)(child_name, child_value, scope)
+            elif len(child):
+                # Спускаемся во вложенный контейнер; текущий продолжится с места остановки
+                child_value = new_container(child)
+                node.nested = True
+                append(child_value)
+                if names is not None:
+                    names.append(child_name)
+                stack.append((child_value, iter(child)))
+                break
+            else:
+                child_value = None
+            append(child_value)
+            if names is not None:
+                names.append(child_name)
+                # Сохраняем значение переменной
+                if scope.forward:
+                    scope.define(child_name, child_value)
+                else:
+                    values[child_name] = child_value
+        else:
+            stack.pop()
+    return root
+
+# Пары (имя, значение) для каждого `let name = value;` верхнего уровня
+def iter_definitions(elements, scope):
+    values = scope.values
+    for element in elements:
+        name = element.tag
+        if not (name.isascii() and name.isidentifier()):
+            raise Exception(f"Invalid name: '{name}'")
+        text = element.text
+        value = text.strip() if text else ""
+
+        # Если элемент имеет текстовое значение
+        if value:
+            value = VALUE_PARSERS.get(value[0], parse_invalid)(name, value, scope)
+            # Сохраняем переменную для последующего использования
+            if scope.forward:
+                scope.define(name, value)
+            else:
+                values[name] = value
+            yield name, value
+
+        # Если элемент имеет дочерние элементы
+        elif len(element):
+            yield name, build_value(element, scope)
+        else:
+            raise Exception(f"Element '{name}' must have either a numeric value or child elements.")
+
+# Строки вывода; вложенные контейнеры обходятся с явным стеком, по строке за раз
+def iter_emit(definitions):
+    for name, value in definitions:
+        if value.__class__ not in CONTAINERS:
+            yield f"let {name} = {value if value.__class__ is int else format_value(value)};"
+            continue
+        yield f"let {name} = ["
+        # Элементы стека: [узел, индекс следующего значения]
+        stack = [[value, 0]]
+        while stack:
+            top = stack[-1]
+            node, start = top
+            level = len(stack)
+            indent = INDENTS[min(level, MAX_INDENT_LEVEL)]
+            is_array = node.__class__ is Array
+            values = node.values
+            if not node.nested:
+                # Контейнер без вложенных контейнеров выводится одним куском
+                texts = map(format_value, values)
+                if not is_array:
+                    texts = map(" => ".join, zip(node.names, texts))
+                yield indent + (",\n" + indent).join(texts) + ","
+                stack.pop()
+                yield INDENTS[min(level - 1, MAX_INDENT_LEVEL)] + "]," if stack else "];"
+                continue
+            for index in range(start, len(values)):
+                child = values[index]
+                prefix = indent if is_array else f"{indent}{node.names[index]} => "
+                if child.__class__ in CONTAINERS:
+                    yield prefix + "["
+                    top[1] = index + 1
+                    stack.append([child, 0])
+                    break
+                yield f"{prefix}{child if child.__class__ is int else format_value(child)},"
+            else:
+                stack.pop()
+                yield INDENTS[min(level - 1, MAX_INDENT_LEVEL)] + "]," if stack else "];"
+
+# Пропускает определения дальше, когда все их значения можно вычислить
+def iter_resolved(definitions, scope):
+    held = []
+    for definition in definitions:
+        if scope.forward:
+            held.append(definition)
+            continue
+        if scope.pending:
+            scope.resolve()
+        if held:
+            yield from held
+            held.clear()
+        yield definition
+    scope.check_defined()
+    scope.resolve()
+    yield from held
+
+# Строки вывода для элементов верхнего уровня
+def iter_lines(elements, scope):
+    return iter_emit(iter_resolved(iter_definitions(elements, scope), scope))
+
+def convert_to_custom_language(xml_root):
+    scope = Scope()  # Хранилище для вычисленных значений
+    return "\n".join(iter_lines(xml_root, scope))
+
+# Элементы верхнего уровня по мере закрытия; после обработки элемент очищается
+def iter_top_level_elements(file_path):
+    depth = 0
+    root = None
+    try:
+        for event, element in ET.iterparse(file_path, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if root is None:
+                    root = element
+                continue
+            depth -= 1
+            if depth == 1:
+                yield element
+                # Освобождаем обработанный элемент вместе с его поддеревом
+                root.clear()
+    except FileNotFoundError:
+        raise Exception(f"Input file not found: {file_path}")
+    except ET.ParseError as e:
+        raise Exception(f"Invalid XML format: {e}")
+
+# Строки потоковой трансляции файла
+def iter_streamed_lines(file_path):
+    return iter_lines(iter_top_level_elements(file_path), Scope())
+
+# Пишет строки через перевод строки, как "\n".join(lines)
+def write_lines(lines, file):
+    separator = ""
+    for line in lines:
+        file.write(separator)
+        file.write(line)
+        separator = "\n"
+
+# Потоковая трансляция во временный файл, который заменяет результат только при успехе
+def convert_file_streaming(input_path, output_path=None):
+    if output_path is None:
+        write_lines(iter_streamed_lines(input_path), sys.stdout)
+        sys.stdout.write("\n")
+        return
+    temp_path = output_path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8", buffering=1024 * 1024) as file:
+            write_lines(iter_streamed_lines(input_path), file)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+OUTPUT_SUFFIX = ".conf"
+MANIFEST_NAME = ".translation-manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Каталог или glob-шаблон включают пакетный режим
+def is_batch_input(path):
+    return os.path.isdir(path) or any(char in path for char in "*?[")
+
+# (базовый каталог, отсортированные входные файлы) для каталога (*.xml рекурсивно) или шаблона
+def collect_inputs(path):
+    if os.path.isdir(path):
+        base = path
+        files = glob.glob(os.path.join(glob.escape(path), "**", "*.xml"), recursive=True)
+    else:
+        files = [file for file in glob.glob(path, recursive=True) if os.path.isfile(file)]
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(file)) for file in files]) if files else ""
+    if not files:
+        raise Exception(f"No input files match: {path}")
+    return base, sorted(files)
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def translator_digest():
+    # Изменение самого транслятора делает недействительными все записи манифеста
+    return file_digest(__file__)
+
+def load_manifest(manifest_path, translator):
+    try:
+        with open(manifest_path, encoding="utf-8") as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("translator") != translator:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(manifest_path, translator, files):
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump({"translator": translator, "files": files}, file, indent=1, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+# Задание пула: хэширует вход и транслирует его, если он изменился; ошибки возвращаются, а не выбрасываются
+def translate_job(job):
+    input_path, output_path, known_digest = job
+    started = time.perf_counter()
+    try:
+        digest = file_digest(input_path)
+        if digest == known_digest and os.path.exists(output_path):
+            return input_path, "skipped", digest, time.perf_counter() - started, 0, None
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        convert_file_streaming(input_path, output_path)
+        return input_path, "translated", digest, time.perf_counter() - started, os.path.getsize(input_path), None
+    except Exception as e:
+        return input_path, "failed", None, time.perf_counter() - started, 0, str(e)
+
+# Транслирует все входы в пуле процессов, пропуская неизменённые по манифесту
+def translate_batch(path, output_dir, jobs=None, manifest_path=None, report=print):
+    base, files = collect_inputs(path)
+    manifest_path = manifest_path or os.path.join(output_dir, MANIFEST_NAME)
+    translator = translator_digest()
+    manifest = load_manifest(manifest_path, translator)
+
+    relatives = [os.path.relpath(os.path.abspath(file), os.path.abspath(base)) for file in files]
+    job_list = [
+        (file, os.path.join(output_dir, os.path.splitext(relative)[0] + OUTPUT_SUFFIX), manifest.get(relative, {}).get("sha256"))
+        for file, relative in zip(files, relatives)
+    ]
+
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {"translated": 0, "skipped": 0, "failed": 0}
+    translated_bytes = 0
+    results = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and len(job_list) > 1 else nullcontext() as executor:
+        if executor is None:
+            outcomes = map(translate_job, job_list)
+        else:
+            # Крупные порции снижают накладные расходы на передачу заданий между процессами
+            outcomes = executor.map(translate_job, job_list, chunksize=max(1, len(job_list) // (jobs * 8)))
+        for relative, (_, output_path, _), result in zip(relatives, job_list, outcomes):
+            _, status, digest, seconds, size, error = result
+            results.append(result)
+            counts[status] += 1
+            if status == "failed":
+                # Устаревший результат удаляется, чтобы не выдавать старую конфигурацию за новую
+                manifest.pop(relative, None)
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                report(f"  failed      {relative}  {seconds * 1000:9.1f} ms  {error}")
+                continue
+            manifest[relative] = {"sha256": digest, "output": os.path.relpath(output_path, output_dir)}
+            translated_bytes += size
+            report(f"  {status:<11} {relative}  {seconds * 1000:9.1f} ms")
+    elapsed = time.perf_counter() - started
+    save_manifest(manifest_path, translator, manifest)
+
+    elapsed = max(elapsed, 1e-9)
+    report(f"{len(job_list)} files in {elapsed:.2f} s with {jobs} worker(s): "
+           f"{counts['translated']} translated, {counts['skipped']} unchanged, {counts['failed']} failed; "
+           f"{counts['translated'] / elapsed:,.1f} files/s, {translated_bytes / 2 ** 20 / elapsed:,.2f} MiB/s")
+    return results
+
+def main():
+    args = parse_args()
+
+    try:
+        if is_batch_input(args.input_file_path):
+            if args.output_dir is None:
+                raise Exception("Batch mode requires --output_dir")
+            results = translate_batch(args.input_file_path, args.output_dir, args.jobs, args.manifest)
+            if any(result[1] == "failed" for result in results):
+                sys.exit(1)
+            return
+
+        if args.stream:
+            if args.output_file is None:
+                print("Converted Configuration:")
+            convert_file_streaming(args.input_file_path, args.output_file)
+            if args.output_file:
+                print(f"Converted configuration written to: {args.output_file}")
+            return
+
+        xml_data = read_input_file(args.input_file_path)
+        xml_root = validate_xml(xml_data)
+        custom_config = convert_to_custom_language(xml_root)
+
+        if args.output_file:
+            with open(args.output_file, "w", encoding="utf-8") as file:
+                file.write(custom_config)
+            print(f"Converted configuration written to: {args.output_file}")
+        else:
+            print("Converted Configuration:")
+            print(custom_config)
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
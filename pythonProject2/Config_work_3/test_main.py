@@ -1,4 +1,8 @@
-from main import validate_xml, convert_to_custom_language
+import os
+import json
+import tempfile
+
+from main import validate_xml, convert_to_custom_language, convert_file_streaming, translate_batch
 
 def run_tests():
     print("Starting tests...")
@@ -121,6 +125,178 @@ let min_limit = 1;
             "expected": "Error",
             "should_raise": True,
         },
+        # Тест 10: Числа с ведущими нулями в словаре приводятся к обычному виду
+        {
+            "name": "Dictionary with leading zeros",
+            "input": """
+            <config>
+                <ports>
+                    <http>0080</http>
+                    <zero>0</zero>
+                </ports>
+            </config>
+            """,
+            "expected": """let ports = [
+    http => 80,
+    zero => 0,
+];""",
+            "should_raise": False,
+        },
+        # Тест 11: Неверное имя ключа в словаре из одних чисел
+        {
+            "name": "Invalid key name in numeric dictionary",
+            "input": """
+            <config>
+                <limits>
+                    <max.size>10</max.size>
+                </limits>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
+        # Тест 12: Словарь со ссылкой, пустым значением и числом
+        {
+            "name": "Dictionary with reference and empty value",
+            "input": """
+            <config>
+                <base>8</base>
+                <sizes>
+                    <small>!(base)</small>
+                    <none></none>
+                    <large>64</large>
+                </sizes>
+            </config>
+            """,
+            "expected": """let base = 8;
+let sizes = [
+    small => 8,
+    none => None,
+    large => 64,
+];""",
+            "should_raise": False,
+        },
+        # Тест 13: Вложенные словари и массивы
+        {
+            "name": "Nested dictionaries and arrays",
+            "input": """
+            <config>
+                <server>
+                    <port>8080</port>
+                    <limits>
+                        <connections>100</connections>
+                        <timeouts type="array">
+                            <value>30</value>
+                            <value>!(port)</value>
+                        </timeouts>
+                    </limits>
+                    <mirrors type="array">
+                        <mirror>
+                            <weight>1</weight>
+                        </mirror>
+                    </mirrors>
+                </server>
+                <fallback>!(connections)</fallback>
+            </config>
+            """,
+            "expected": """let server = [
+    port => 8080,
+    limits => [
+        connections => 100,
+        timeouts => [
+            30,
+            8080,
+        ],
+    ],
+    mirrors => [
+        [
+            weight => 1,
+        ],
+    ],
+];
+let fallback = 100;""",
+            "should_raise": False,
+        },
+        # Тест 14: Неверное имя элемента массива
+        {
+            "name": "Invalid name in array",
+            "input": """
+            <config>
+                <ports type="array">
+                    <port.http>80</port.http>
+                    <port>!(missing)</port>
+                </ports>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
+        # Тест 15: Выражения над константами, объявленными позже
+        {
+            "name": "Expressions with forward references",
+            "input": """
+            <config>
+                <area>!(* width height)</area>
+                <label>!(concat "size: " (max width (+ height 10)))</label>
+                <width>!(- height 5)</width>
+                <height>!(mod 47 20)</height>
+            </config>
+            """,
+            "expected": """let area = 14;
+let label = "size: 17";
+let width = 2;
+let height = 7;""",
+            "should_raise": False,
+        },
+        # Тест 16: Циклическая ссылка между константами
+        {
+            "name": "Circular reference",
+            "input": """
+            <config>
+                <a>!(+ b 1)</a>
+                <b>!(* c 2)</b>
+                <c>!(a)</c>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
+        # Тест 17: Ссылка на необъявленную константу
+        {
+            "name": "Undefined reference in expression",
+            "input": """
+            <config>
+                <total>!(+ base extra)</total>
+                <base>10</base>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
+        # Тест 18: Деление на ноль
+        {
+            "name": "Division by zero",
+            "input": """
+            <config>
+                <zero>!(- limit limit)</zero>
+                <ratio>!(/ limit zero)</ratio>
+                <limit>8</limit>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
+        # Тест 19: Вложенное выражение на месте операции
+        {
+            "name": "Call in operation position",
+            "input": """
+            <config>
+                <value>!((+ 1 2))</value>
+            </config>
+            """,
+            "expected": "Error",
+            "should_raise": True,
+        },
     ]
 
     for test in tests:
@@ -143,5 +319,97 @@ let min_limit = 1;
             else:
                 print(f"❌ Test {test['name']} failed. Unexpected error: {e}")
 
+    # Потоковый режим должен давать тот же результат, что и разбор всего дерева
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, "input.xml")
+        output_path = os.path.join(temp_dir, "output.txt")
+        for test in tests:
+            print(f"Running streaming test: {test['name']}")
+            with open(input_path, "w", encoding="utf-8") as file:
+                file.write(test["input"])
+            try:
+                convert_file_streaming(input_path, output_path)
+                with open(output_path, encoding="utf-8") as file:
+                    output = file.read()
+
+                if test["should_raise"]:
+                    print(f"❌ Streaming test {test['name']} failed. Expected an error, but got output:\n{output}")
+                elif output.strip() == test["expected"].strip():
+                    print(f"✅ Streaming test {test['name']} passed.")
+                else:
+                    print(f"❌ Streaming test {test['name']} failed. Output:\n{output}\nExpected:\n{test['expected']}")
+            except Exception as e:
+                if test["should_raise"] and not os.path.exists(output_path + ".tmp"):
+                    print(f"✅ Streaming test {test['name']} passed with expected error: {e}")
+                else:
+                    print(f"❌ Streaming test {test['name']} failed. Unexpected error: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+    # Глубокая вложенность не должна упираться в ограничение рекурсии
+    print("Running test: Deeply nested document")
+    depth = 100000
+    try:
+        root = validate_xml("<config><deep>" + "<level>" * depth + "1" + "</level>" * depth + "</deep></config>")
+        lines = convert_to_custom_language(root).split("\n")
+        if len(lines) == 2 * depth + 1 and lines[depth].strip() == "level => 1," and lines[-1] == "];":
+            print("✅ Test Deeply nested document passed.")
+        else:
+            print(f"❌ Test Deeply nested document failed. Got {len(lines)} lines.")
+    except Exception as e:
+        print(f"❌ Test Deeply nested document failed. Unexpected error: {e}")
+
+    # Глубоко вложенное выражение вычисляется без рекурсии
+    print("Running test: Deeply nested expression")
+    depth = 50000
+    try:
+        root = validate_xml("<config><total>!" + "(+ 1 " * depth + "base" + ")" * depth + "</total><base>2</base></config>")
+        output = convert_to_custom_language(root)
+        if output == f"let total = {depth + 2};\nlet base = 2;":
+            print("✅ Test Deeply nested expression passed.")
+        else:
+            print(f"❌ Test Deeply nested expression failed. Output:\n{output}")
+    except Exception as e:
+        print(f"❌ Test Deeply nested expression failed. Unexpected error: {e}")
+
+    # Пакетный режим: параллельная трансляция каталога и пропуск неизменённых файлов
+    print("Running test: Batch translation")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_dir = os.path.join(temp_dir, "configs")
+        output_dir = os.path.join(temp_dir, "out")
+        os.makedirs(os.path.join(input_dir, "nested"))
+        inputs = {
+            "first.xml": "<config><port>!(+ base 80)</port><base>8000</base></config>",
+            "nested/second.xml": "<config><workers>4</workers></config>",
+            "broken.xml": "<config><value>!(1</value></config>",
+        }
+        for relative, text in inputs.items():
+            with open(os.path.join(input_dir, relative), "w", encoding="utf-8") as file:
+                file.write(text)
+        try:
+            statuses = [result[1] for result in translate_batch(input_dir, output_dir, jobs=2, report=lambda line: None)]
+            with open(os.path.join(output_dir, "first.conf"), encoding="utf-8") as file:
+                first = file.read()
+            with open(os.path.join(input_dir, "nested", "second.xml"), "w", encoding="utf-8") as file:
+                file.write("<config><workers>16</workers></config>")
+            rerun = [result[1] for result in translate_batch(input_dir, output_dir, jobs=2, report=lambda line: None)]
+            with open(os.path.join(output_dir, "nested", "second.conf"), encoding="utf-8") as file:
+                second = file.read()
+            # Файл, который раньше транслировался, ломается: старый результат и запись манифеста удаляются
+            with open(os.path.join(input_dir, "first.xml"), "w", encoding="utf-8") as file:
+                file.write("<config><port>!(+ base</port></config>")
+            broken = [result[1] for result in translate_batch(input_dir, output_dir, jobs=2, report=lambda line: None)]
+            with open(os.path.join(output_dir, ".translation-manifest.json"), encoding="utf-8") as file:
+                manifest = json.load(file)["files"]
+            stale_removed = not os.path.exists(os.path.join(output_dir, "first.conf")) and "first.xml" not in manifest
+            if (statuses == ["failed", "translated", "translated"] and rerun == ["failed", "skipped", "translated"]
+                    and broken == ["failed", "failed", "skipped"] and stale_removed
+                    and first == "let port = 8080;\nlet base = 8000;" and second == "let workers = 16;"):
+                print("✅ Test Batch translation passed.")
+            else:
+                print(f"❌ Test Batch translation failed. Statuses: {statuses}, {rerun}. Output:\n{first}\n{second}")
+        except Exception as e:
+            print(f"❌ Test Batch translation failed. Unexpected error: {e}")
+
 if __name__ == "__main__":
     run_tests()